@@ -0,0 +1,48 @@
+from django.db import router
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# User fields copied into every token (see ClaimsTokenObtainPairSerializer),
+# so requests can be authenticated without loading the User row.
+USER_CLAIMS = ('email', 'is_active', 'is_staff')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token claims
+    instead of running a SELECT on every request.
+
+    request.user is a regular User instance with only id, email, is_active
+    and is_staff loaded; any other field is deferred and fetched from the
+    database the first time a view reads it. Tokens issued before the claims
+    existed fall back to the usual database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if not validated_token['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        loaded = {
+            User._meta.pk.attname: User._meta.pk.to_python(user_id),
+            **{claim: validated_token[claim] for claim in USER_CLAIMS},
+        }
+        values = [loaded.get(f.attname, DEFERRED) for f in User._meta.concrete_fields]
+        return User.from_db(router.db_for_read(User), None, values)
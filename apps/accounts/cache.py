@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.cache import cache
+
+PROFILE_CACHE_TIMEOUT = getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300)
+
+
+def profile_cache_key(user_id):
+    return f'accounts:profile:{user_id}'
+
+
+def get_cached_profile(user_id):
+    return cache.get(profile_cache_key(user_id))
+
+
+def set_cached_profile(user_id, data):
+    cache.set(profile_cache_key(user_id), dict(data), PROFILE_CACHE_TIMEOUT)
+
+
+def invalidate_profile(user_id):
+    cache.delete(profile_cache_key(user_id))
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from .models import User, Profile
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import add_user_claims
+from .cache import invalidate_profile
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,7 +28,8 @@ class UserSerializer(serializers.ModelSerializer):
         for attr, value in profile_data.items():
             setattr(profile, attr, value)
         profile.save()
-        
+
+        invalidate_profile(instance.pk)
         return instance
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -40,6 +45,28 @@ class RegisterSerializer(serializers.ModelSerializer):
             username=validated_data.get('username', validated_data['email']),
             password=validated_data['password']
         )
-        # Profile is created by signal or manually here
-        Profile.objects.get_or_create(user=user)
+        # Profile is created by the post_save signal (see signals.py)
         return user
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login tokens carry the user claims StatelessJWTAuthentication needs."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-reads the user on every refresh so claims (and deactivation) are at
+    most one access-token lifetime stale.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User is inactive or no longer exists', code='user_inactive')
+        add_user_claims(refresh, user)
+        return super().validate({'refresh': str(refresh)})
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .cache import invalidate_profile
+from .models import User, Profile
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    # Profiles are created eagerly so reads never need get_or_create
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
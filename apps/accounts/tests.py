@@ -1,3 +1,107 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import User, Profile
 
-# Create your tests here.
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='authuser',
+            email='auth@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+
+    def _login(self):
+        response = self.client.post('/api/auth/token/', {'email': 'auth@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _pull(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'})
+
+    # --- USE CASE 1: Authenticated requests skip the User SELECT ---
+    def test_claims_token_skips_user_query(self):
+        access = self._login()['access']
+        with self.assertNumQueries(4):
+            response = self._pull(access)
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_use_the_token_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._login()['access']}")
+        response = self.client.post('/api/weeks/', {'week_start_date': '2025-03-03'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.user.weekly_periods.count(), 1)
+
+    # --- USE CASE 2: Deferred fields load on demand ---
+    def test_deferred_fields_load_lazily(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._login()['access']}")
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'authuser')
+
+    # --- USE CASE 3: Tokens without claims fall back to the database ---
+    def test_legacy_token_falls_back_to_db(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        with self.assertNumQueries(5):
+            response = self._pull(access)
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_claim_is_rejected(self):
+        access = self._login()['access']
+        token = RefreshToken(self._login()['refresh']).access_token
+        token['is_active'] = False
+        self.assertEqual(self._pull(str(token)).status_code, 401)
+        self.assertEqual(self._pull(access).status_code, 200)
+
+    def test_refresh_restamps_claims(self):
+        refresh = self._login()['refresh']
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='profileuser',
+            email='profile@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    # --- USE CASE 1: Profiles exist from signup ---
+    def test_profile_created_on_signup(self):
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+        response = APIClient().post('/api/auth/register/', {
+            'email': 'new@example.com', 'username': 'new', 'password': 'password123'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Profile.objects.filter(user__email='new@example.com').exists())
+
+    # --- USE CASE 2: Repeated reads are served from the cache ---
+    def test_profile_reads_are_cached(self):
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/auth/profile/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/auth/profile/')
+        self.assertEqual(first.data, second.data)
+
+    # --- USE CASE 3: Updates invalidate the cached profile ---
+    def test_update_invalidates_cache(self):
+        self.client.get('/api/auth/profile/')
+        response = self.client.patch('/api/auth/profile/', {'profile': {'theme_preference': 'dark'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/profile/').data['profile']['theme_preference'], 'dark')
+
+    def test_missing_profile_is_recreated(self):
+        Profile.objects.filter(user=self.user).delete()
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['profile']['currency'], 'USD')
@@ -2,6 +2,7 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from .serializers import RegisterSerializer, UserSerializer, ProfileSerializer
 from .models import User, Profile
+from .cache import get_cached_profile, set_cached_profile
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -13,7 +14,16 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        user = self.request.user
-        # Ensure profile exists (Lazy creation)
-        Profile.objects.get_or_create(user=user)
+        # One query: the user row with its profile joined
+        user = User.objects.select_related('profile').get(pk=self.request.user.pk)
+        if not hasattr(user, 'profile'):
+            # Users created before profiles were made on signup
+            Profile.objects.create(user=user)
         return user
+
+    def retrieve(self, request, *args, **kwargs):
+        data = get_cached_profile(request.user.pk)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            set_cached_profile(request.user.pk, data)
+        return Response(data)
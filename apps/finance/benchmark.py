@@ -0,0 +1,164 @@
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection, transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.accounts.models import User
+from core.metrics import percentile
+from . import changelog, rollups
+from .models import Transaction, ScheduledPayment, WeeklyPeriod
+from .seeding import generate_transactions
+
+# Scenario names, in the order they run
+SCENARIOS = ('pull_full', 'pull_delta', 'push', 'list', 'retrieve', 'mark_paid')
+
+PUSH_BATCH = 50
+# Pending payments seeded per user; mark_paid adds more when it runs out
+SEED_PAYMENTS = 200
+
+
+def _pending_payments(user, count):
+    """Create `count` pending payments for the user."""
+    return ScheduledPayment.objects.bulk_create([
+        ScheduledPayment(user=user, payee=f'Bill {i}', amount=Decimal('25.00'),
+                         due_date=date.today() + timedelta(days=i % 30), expected_method='CARD')
+        for i in range(count)
+    ])
+
+
+def seed(users, days, seed_value=0, payments=SEED_PAYMENTS):
+    """
+    Create `users` synthetic users, each with `days` of history generated
+    like scripts/reset_and_seed.py, one WeeklyPeriod per week and `payments`
+    pending payments for the mark-paid scenario. Returns the users.
+    """
+    rng = random.Random(seed_value)
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+
+    created = User.objects.bulk_create([
+        User(username=f'bench{i}-{uuid.uuid4().hex[:8]}', email=f'bench{i}-{uuid.uuid4().hex[:8]}@bench.local')
+        for i in range(users)
+    ])
+    for user in created:
+        Transaction.objects.bulk_create([
+            Transaction(user=user, type=tx['type'], amount=tx['amount'], date=tx['date'],
+                        counterparty=tx['counterparty'], description=tx['desc'], method=tx['method'])
+            for tx in generate_transactions(start_date, end_date, rng)
+        ], batch_size=500)
+        first_monday = start_date - timedelta(days=start_date.weekday())
+        WeeklyPeriod.objects.bulk_create([
+            WeeklyPeriod(user=user, week_start_date=first_monday + timedelta(weeks=w),
+                         opening_balance=Decimal('2500.00'))
+            for w in range((end_date - first_monday).days // 7 + 1)
+        ])
+        _pending_payments(user, payments)
+    rollups.rebuild(created)
+    changelog.rebuild(created)
+    return created
+
+
+def run_benchmark(users, iterations):
+    """
+    Drive every scenario `iterations` times through the test client,
+    rotating over `users`. Returns the JSON-ready report.
+    """
+    clients = []
+    for user in users:
+        client = APIClient()
+        client.force_authenticate(user)
+        tx_ids = list(Transaction.objects.filter(user=user).values_list('id', flat=True)[:iterations])
+        payment_ids = list(
+            ScheduledPayment.objects.filter(user=user, status='PENDING').values_list('id', flat=True)
+        )
+        clients.append((user, client, tx_ids, payment_ids))
+
+    def requests_for(name, i):
+        user, client, tx_ids, payment_ids = clients[i % len(clients)]
+        if name == 'pull_full':
+            return lambda: client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'})
+        if name == 'pull_delta':
+            since = timezone.now().isoformat()
+            return lambda: client.get('/api/sync/pull/', {'since': since})
+        if name == 'push':
+            payload = {'transactions': [
+                {'id': str(uuid.uuid4()), 'type': 'EXPENSE', 'amount': '4.50', 'date': str(date.today()),
+                 'counterparty': 'Bench', 'method': 'CARD'}
+                for _ in range(PUSH_BATCH)
+            ]}
+            return lambda: client.post('/api/sync/push/', payload, format='json')
+        if name == 'list':
+            return lambda: client.get('/api/transactions/', {'page_size': 100})
+        if name == 'retrieve':
+            tx_id = tx_ids[(i // len(clients)) % len(tx_ids)]
+            return lambda: client.get(f'/api/transactions/{tx_id}/')
+        if name == 'mark_paid':
+            if not payment_ids:
+                # More iterations than seeded payments: add a fresh batch,
+                # here rather than in the timed request
+                with db_transaction.atomic():
+                    payments = _pending_payments(user, SEED_PAYMENTS)
+                    changelog.record_changes((payment, True) for payment in payments)
+                payment_ids.extend(payment.id for payment in payments)
+            payment_id = payment_ids.pop()
+            return lambda: client.post(f'/api/payments/{payment_id}/mark-paid/')
+        raise ValueError(name)
+
+    report = {}
+    for name in SCENARIOS:
+        latencies, queries, statuses = [], [], set()
+        started = time.perf_counter()
+        for i in range(iterations):
+            send = requests_for(name, i)
+            with CaptureQueriesContext(connection) as ctx:
+                begin = time.perf_counter()
+                response = send()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append((time.perf_counter() - begin) * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        report[name] = {
+            'requests': iterations,
+            'statuses': sorted(statuses),
+            'throughput_rps': round(iterations / elapsed, 2),
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 2),
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+            },
+            'queries': {'min': min(queries), 'max': max(queries)},
+        }
+    return report
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Regressions of `report` against a saved `baseline` report.
+    Latency p50 may grow by `threshold` (a fraction) before it counts;
+    any increase in the query count is a regression.
+    """
+    regressions = []
+    for name, current in report.get('scenarios', {}).items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        allowed = previous['latency_ms']['p50'] * (1 + threshold)
+        if current['latency_ms']['p50'] > allowed:
+            regressions.append(
+                f"{name}: p50 {current['latency_ms']['p50']}ms > {allowed:.2f}ms "
+                f"(baseline {previous['latency_ms']['p50']}ms)"
+            )
+        if current['queries']['max'] > previous['queries']['max']:
+            regressions.append(
+                f"{name}: {current['queries']['max']} queries > baseline {previous['queries']['max']}"
+            )
+    return regressions
@@ -0,0 +1,46 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+UPCOMING_CACHE_TIMEOUT = getattr(settings, 'UPCOMING_CACHE_TIMEOUT', 300)
+
+
+def upcoming_cache_key(user_id):
+    return f'finance:upcoming:{user_id}'
+
+
+def upcoming_version_key(user_id):
+    return f'finance:upcoming:{user_id}:version'
+
+
+def upcoming_version(user_id):
+    """
+    Token of the user's data as of now; read it before loading the data.
+    Every committed write replaces it, so an entry loaded before a write
+    but stored after it carries an old token and is never served.
+    """
+    return cache.get_or_set(upcoming_version_key(user_id), lambda: uuid.uuid4().hex, None)
+
+
+def get_cached_upcoming(user_id, today, days, version):
+    cached = cache.get(upcoming_cache_key(user_id))
+    if not cached or cached['version'] != version:
+        return None
+    return cached['entries'].get((today, days))
+
+
+def set_cached_upcoming(user_id, today, days, data, version):
+    # One entry per user holds every window asked for today, so a single
+    # token covers them all
+    cached = cache.get(upcoming_cache_key(user_id))
+    entries = {}
+    if cached and cached['version'] == version:
+        entries = {window: value for window, value in cached['entries'].items() if window[0] == today}
+    entries[(today, days)] = data
+    cache.set(upcoming_cache_key(user_id), {'version': version, 'entries': entries}, UPCOMING_CACHE_TIMEOUT)
+
+
+def invalidate_upcoming(user_ids):
+    # New tokens also retire what reads still in flight are about to store
+    cache.set_many({upcoming_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+    cache.delete_many([upcoming_cache_key(user_id) for user_id in user_ids])
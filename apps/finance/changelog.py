@@ -0,0 +1,131 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import BigIntegerField, Case, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+from .cache import invalidate_upcoming
+from .models import Transaction, ScheduledPayment, WeeklyPeriod, RecurringPayment, SyncCounter, ChangeLog
+
+# Keys match the sections of a sync pull/push
+MODELS = {
+    'transactions': Transaction,
+    'payments': ScheduledPayment,
+    'weeks': WeeklyPeriod,
+    'recurring': RecurringPayment,
+}
+KEYS = {model: key for key, model in MODELS.items()}
+
+LOG_BATCH_SIZE = 1000
+
+
+def operation(instance, created):
+    if created:
+        return 'create'
+    return 'delete' if instance.deleted_at is not None else 'update'
+
+
+def record_changes(changes):
+    """
+    Append (instance, created) writes to the change log.
+    Rows may belong to several users; each user gets one block of
+    consecutive sequence numbers, so the cost is a few counter queries
+    (independent of the number of users) plus one bulk insert. Must run
+    inside the transaction that wrote the rows: the counter row locks keep
+    each user's sequence gapless and in commit order.
+    """
+    by_user = defaultdict(list)
+    for instance, created in changes:
+        by_user[instance.user_id].append((KEYS[type(instance)], instance.pk, operation(instance, created)))
+    if len(by_user) == 1:
+        [(user_id, items)] = by_user.items()
+        last = {user_id: _allocate(user_id, len(items))}
+    else:
+        last = _allocate_many({user_id: len(items) for user_id, items in by_user.items()})
+
+    entries = []
+    for user_id, items in by_user.items():
+        first = last[user_id] - len(items) + 1
+        entries.extend(
+            ChangeLog(user_id=user_id, seq=first + i, model=key, object_id=object_id, op=op)
+            for i, (key, object_id, op) in enumerate(items)
+        )
+    ChangeLog.objects.bulk_create(entries, batch_size=LOG_BATCH_SIZE)
+    # Any logged write can change pending payments or the balance. Cleared
+    # once committed; reads that loaded the old state before then carry an
+    # old version and are not served (see cache.upcoming_version).
+    user_ids = list(by_user)
+    db_transaction.on_commit(lambda: invalidate_upcoming(user_ids))
+
+
+def _allocate(user_id, count):
+    """Reserve `count` sequence numbers for the user; returns the last one."""
+    counter = SyncCounter.objects.filter(user_id=user_id)
+    if not counter.update(seq=F('seq') + count, updated_at=timezone.now()):
+        try:
+            with db_transaction.atomic():
+                SyncCounter.objects.create(user_id=user_id, seq=count)
+            return count
+        except IntegrityError:
+            # Created concurrently by another writer
+            counter.update(seq=F('seq') + count, updated_at=timezone.now())
+    return counter.values_list('seq', flat=True).get()
+
+
+def _allocate_many(counts):
+    """_allocate() for {user_id: count} in four queries; returns {user_id: last seq}."""
+    if not counts:
+        return {}
+    SyncCounter.objects.bulk_create([SyncCounter(user_id=user_id) for user_id in counts], ignore_conflicts=True)
+    counters = SyncCounter.objects.filter(user_id__in=list(counts))
+    # Lock in a fixed order so concurrent multi-user writers cannot deadlock
+    list(counters.select_for_update().order_by('user_id').values_list('user_id', flat=True))
+    counters.update(
+        seq=F('seq') + Case(*(When(user_id=user_id, then=Value(count)) for user_id, count in counts.items()),
+                            output_field=BigIntegerField()),
+        updated_at=timezone.now(),
+    )
+    return dict(counters.values_list('user_id', 'seq'))
+
+
+def current(user):
+    """(latest seq, time of the latest change) for the user; (0, None) before any write."""
+    row = SyncCounter.objects.filter(user=user).values_list('seq', 'updated_at').first()
+    return row or (0, None)
+
+
+def changed_between(queryset, key, user, after, upto):
+    """Rows of `queryset` logged with after < seq <= upto."""
+    logged = ChangeLog.objects.filter(user=user, model=key, seq__gt=after, seq__lte=upto)
+    return queryset.filter(id__in=logged.values('object_id'))
+
+
+def compact(users=None):
+    """
+    Drop entries superseded by a later entry for the same object.
+    A pull from any cursor still sees every object changed after it, through
+    the object's latest entry. Returns the number of entries deleted.
+    """
+    later = ChangeLog.objects.filter(
+        user=OuterRef('user'), model=OuterRef('model'),
+        object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'),
+    )
+    superseded = ChangeLog.objects.filter(Exists(later))
+    if users is not None:
+        superseded = superseded.filter(user__in=users)
+    deleted, _ = superseded.delete()
+    return deleted
+
+
+def rebuild(users):
+    """
+    Log every synced row of the given users again, after their current
+    sequence number, and drop the older entries. Needed after writes that
+    bypass the log (bulk inserts in seeding scripts); clients simply
+    receive everything once more on their next pull.
+    """
+    with db_transaction.atomic():
+        for user in users:
+            ChangeLog.objects.filter(user=user).delete()
+            rows = []
+            for key, model in MODELS.items():
+                rows.extend(model.objects.filter(user=user).order_by('updated_at').only('id', 'user', 'deleted_at'))
+            record_changes((row, False) for row in rows)
@@ -0,0 +1,40 @@
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from . import changelog
+
+
+class Validators:
+    """
+    ETag / Last-Modified pair for one response, derived from the caller's
+    change log sequence: a single primary-key lookup on SyncCounter. Any
+    logged write to the user's data bumps it.
+    """
+
+    def __init__(self, request):
+        self.seq, last_modified = changelog.current(request.user)
+        self.last_modified = int(last_modified.timestamp()) if last_modified else None
+        # The same data renders differently per page, format and caller
+        key = '|'.join((
+            str(request.user.pk),
+            request.get_full_path(),
+            getattr(request, 'accepted_media_type', '') or '',
+            request.META.get('HTTP_X_SYNC_DIAGNOSTICS', ''),
+            str(self.seq),
+        ))
+        self.etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def not_modified(self, request):
+        """304 (or 412) response when the client's copy is current, else None."""
+        return get_conditional_response(
+            request._request, etag=self.etag, last_modified=self.last_modified
+        )
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        # Per-user data: clients may keep it but must revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,127 @@
+"""
+Streaming export of a user's finance history.
+
+Rows are read with .values_list().iterator(), converted column by column and
+written out in chunks, so memory stays flat whatever the history size and no
+model instance is ever built. Formats:
+
+    csv       one section per file, header row first
+    ndjson    one {"section", "data"} object per row, all sections
+    columnar  row groups of {"section", "fields", "columns"}, one list of
+              values per field: a Parquet-like layout that needs no pyarrow
+"""
+
+import csv
+import json
+from django.db import models
+from .changelog import MODELS as SECTIONS
+
+# output -> (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/x-ndjson', 'columnar.ndjson'),
+}
+
+# Rows fetched per DB round trip, and lines per written chunk
+EXPORT_CHUNK_SIZE = 2000
+COLUMNAR_ROW_GROUP = 10000
+
+
+def columns(model):
+    """Exported column names: every concrete field except the owner."""
+    return [field.name for field in model._meta.concrete_fields if field.name != 'user']
+
+
+def _converter(field):
+    if isinstance(field, (models.UUIDField, models.ForeignKey)):
+        return str
+    if isinstance(field, models.DecimalField):
+        return lambda value: format(value, 'f')
+    if isinstance(field, (models.DateTimeField, models.DateField)):
+        return lambda value: value.isoformat()
+    return None
+
+
+def rows(user, section, include_deleted=False):
+    """Yield the section's rows as lists of JSON-ready values, in column order."""
+    model = SECTIONS[section]
+    queryset = model.objects.filter(user=user)
+    if not include_deleted:
+        queryset = queryset.filter(deleted_at__isnull=True)
+    names = columns(model)
+    converters = [_converter(model._meta.get_field(name)) for name in names]
+    for row in queryset.order_by('pk').values_list(*names).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            value if convert is None or value is None else convert(value)
+            for value, convert in zip(row, converters)
+        ]
+
+
+def _chunked(lines, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+class _Echo:
+    """File-like target that makes csv.writer return the formatted line."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(user, section, include_deleted=False):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(columns(SECTIONS[section]))
+        for row in rows(user, section, include_deleted):
+            yield writer.writerow(['' if value is None else value for value in row])
+    return _chunked(lines())
+
+
+def export_ndjson(user, sections, include_deleted=False):
+    def lines():
+        for section in sections:
+            names = columns(SECTIONS[section])
+            for row in rows(user, section, include_deleted):
+                yield json.dumps({'section': section, 'data': dict(zip(names, row))}) + '\n'
+    return _chunked(lines())
+
+
+def export_columnar(user, sections, include_deleted=False, row_group=None):
+    row_group = row_group or COLUMNAR_ROW_GROUP
+    for section in sections:
+        names = columns(SECTIONS[section])
+        group, size = [[] for _ in names], 0
+        for row in rows(user, section, include_deleted):
+            for values, value in zip(group, row):
+                values.append(value)
+            size += 1
+            if size >= row_group:
+                yield json.dumps({'section': section, 'fields': names, 'columns': group}) + '\n'
+                group, size = [[] for _ in names], 0
+        if size:
+            yield json.dumps({'section': section, 'fields': names, 'columns': group}) + '\n'
+
+
+def export(user, output, sections, include_deleted=False):
+    """Iterator of text chunks of the given sections in `output` (a FORMATS key)."""
+    if output not in FORMATS:
+        raise ValueError(f"Unknown output '{output}'; use one of {', '.join(FORMATS)}.")
+    unknown = [section for section in sections if section not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown section(s): {', '.join(unknown)}.")
+    if output == 'csv':
+        if len(sections) != 1:
+            raise ValueError('CSV exports one section at a time.')
+        return export_csv(user, sections[0], include_deleted)
+    if output == 'ndjson':
+        return export_ndjson(user, sections, include_deleted)
+    return export_columnar(user, sections, include_deleted)
@@ -0,0 +1,71 @@
+import functools
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+# How long a stored result is replayed for the same Idempotency-Key
+IDEMPOTENCY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)
+# Upper bound on how long a crashed request can keep its key locked
+IDEMPOTENCY_LOCK_TTL = 30
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response({'error': 'Idempotency-Key was used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(handler):
+    """
+    Replay the stored response when a request is retried with the same
+    `Idempotency-Key` header. Keys are scoped to the user; reusing one for a
+    different request is a 422, and a retry that arrives while the first
+    attempt is still running gets a 409. Server errors are not stored, so
+    they can be retried. Needs a cache shared by all workers (CACHE_URL).
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if not key:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = f'finance:idempotency:{request.user.pk}:{hashlib.sha256(key.encode()).hexdigest()}'
+        fingerprint = _fingerprint(request)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        lock_key = f'{cache_key}:lock'
+        if not cache.add(lock_key, True, IDEMPOTENCY_LOCK_TTL):
+            return Response({'error': 'A request with this Idempotency-Key is in progress'},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            # The first attempt may have stored its result and released the
+            # lock between the read above and add()
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, IDEMPOTENCY_TTL)
+        finally:
+            cache.delete(lock_key)
+        return response
+    return wrapper
@@ -0,0 +1,245 @@
+"""
+Bank statement import as a generator pipeline:
+
+    read_csv / read_ofx  ->  normalise  ->  import_records (batched writes)
+
+Readers yield one raw record at a time, so memory stays bounded by the batch
+size whatever the statement size. Every imported row carries an
+`import_hash`, and rows whose hash already exists for the user are skipped,
+so importing the same statement twice is harmless.
+"""
+
+import csv
+import hashlib
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.db import transaction as db_transaction
+from . import changelog, rollups
+from .models import Transaction
+
+IMPORT_BATCH_SIZE = 1000
+# Row errors kept in the result; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Record key -> CSV column name
+DEFAULT_CSV_MAPPING = {
+    'date': 'date',
+    'amount': 'amount',
+    'counterparty': 'counterparty',
+    'description': 'description',
+    'type': None,
+    'method': None,
+}
+
+OFX_CHUNK_SIZE = 64 * 1024
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_csv(stream, mapping=None, delimiter=',', date_format='%Y-%m-%d', decimal_comma=False):
+    """
+    Yield records from a CSV text stream with a header row. `mapping` maps
+    record keys to column names (see DEFAULT_CSV_MAPPING); amounts are signed,
+    negative meaning expense, unless a `type` column is mapped.
+    """
+    columns = {**DEFAULT_CSV_MAPPING, **(mapping or {})}
+    reader = csv.DictReader(stream, delimiter=delimiter)
+    missing = [columns[key] for key in ('date', 'amount') if columns[key] not in (reader.fieldnames or ())]
+    if missing:
+        raise ImportRowError(f"Missing column(s): {', '.join(missing)}")
+    for row in reader:
+        # Short rows leave None in the missing cells
+        if row[columns['date']] is None or row[columns['amount']] is None:
+            yield ImportRowError(f"Line {reader.line_num}: missing cells")
+            continue
+        try:
+            record = {
+                'date': datetime.strptime(row[columns['date']].strip(), date_format).date(),
+                'amount': _parse_amount(row[columns['amount']], decimal_comma),
+            }
+        except (ValueError, InvalidOperation):
+            yield ImportRowError(f"Line {reader.line_num}: invalid date or amount")
+            continue
+        for key in ('counterparty', 'description', 'type', 'method'):
+            if columns[key] and row.get(columns[key]):
+                record[key] = row[columns[key]].strip()
+        yield record
+
+
+def _parse_amount(value, decimal_comma):
+    value = re.sub(r'[^0-9,.\-+]', '', value)
+    if decimal_comma:
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    return Decimal(value)
+
+
+def read_ofx(stream):
+    """
+    Yield records from the <STMTTRN> blocks of an OFX statement (SGML or
+    XML flavour). The stream is tokenised in fixed-size chunks, so files
+    written on a single line are handled in constant memory too.
+    """
+    current = None
+    for tag, closing, value in _ofx_tokens(stream):
+        if tag == 'STMTTRN':
+            if closing and current is not None:
+                yield _ofx_record(current)
+                current = None
+            elif not closing:
+                current = {}
+        elif current is not None and not closing and value:
+            current[tag] = value
+
+
+def _ofx_tokens(stream):
+    buffer = ''
+    while True:
+        chunk = stream.read(OFX_CHUNK_SIZE)
+        buffer += chunk
+        # Keep a possibly incomplete trailing tag for the next chunk
+        end = len(buffer) if not chunk else buffer.rfind('<')
+        for match in OFX_TAG.finditer(buffer, 0, max(end, 0)):
+            yield match.group(2).upper(), bool(match.group(1)), match.group(3).strip()
+        if not chunk:
+            return
+        buffer = buffer[max(end, 0):]
+
+
+def _ofx_record(fields):
+    try:
+        record = {
+            'date': datetime.strptime(fields['DTPOSTED'][:8], '%Y%m%d').date(),
+            'amount': Decimal(fields['TRNAMT'].replace(',', '.')),
+        }
+    except (KeyError, ValueError, InvalidOperation):
+        return ImportRowError(f"Transaction {fields.get('FITID', '?')}: invalid DTPOSTED or TRNAMT")
+    record['counterparty'] = fields.get('NAME') or fields.get('PAYEE') or ''
+    record['description'] = fields.get('MEMO', '')
+    if fields.get('FITID'):
+        record['reference'] = fields['FITID']
+    return record
+
+
+def read_statement(stream, file_type, **csv_options):
+    """Records of a text stream: file_type is 'ofx' or 'csv' (with read_csv options)."""
+    if file_type == 'ofx':
+        return read_ofx(stream)
+    return read_csv(stream, **csv_options)
+
+
+def guess_file_type(filename):
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def row_identity(record):
+    """
+    What tells two statement rows of a day apart, short of a reference:
+    signed amount, stated type and counterparty. An expense and a refund of
+    the same amount are different rows.
+    """
+    return (
+        f"{record['amount']:.2f}",
+        (record.get('type') or '').upper(),
+        (record.get('counterparty') or '').lower(),
+    )
+
+
+def import_hash(record, occurrence):
+    """
+    Stable hash of a statement row: the bank's own reference when there is
+    one (OFX FITID), otherwise its date and row_identity() plus the
+    occurrence number of that identity within the day, so two identical
+    coffees on the same day are both kept.
+    """
+    if record.get('reference'):
+        key = f"ref|{record['reference']}"
+    else:
+        key = '|'.join((record['date'].isoformat(), *row_identity(record), str(occurrence)))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def normalise(user, records, default_method='OTHER'):
+    """
+    Turn raw records into unsaved Transactions (errors pass through).
+    Occurrence counters are kept for the current day only, which relies on
+    statements being in date order, as bank exports are.
+    """
+    methods = {code for code, _ in Transaction.METHOD_CHOICES}
+    types = {code for code, _ in Transaction.TYPE_CHOICES}
+    day, seen = None, {}
+    for record in records:
+        if isinstance(record, ImportRowError):
+            yield record
+            continue
+        if record['date'] != day:
+            day, seen = record['date'], {}
+        identity = row_identity(record)
+        seen[identity] = seen.get(identity, 0) + 1
+
+        type = (record.get('type') or '').upper()
+        if type not in types:
+            type = 'EXPENSE' if record['amount'] < 0 else 'INCOME'
+        method = (record.get('method') or '').upper()
+        yield Transaction(
+            user=user,
+            type=type,
+            amount=abs(record['amount']).quantize(Decimal('0.01')),
+            date=record['date'],
+            counterparty=(record.get('counterparty') or 'Unknown')[:255],
+            description=record.get('description', ''),
+            method=method if method in methods else default_method,
+            import_hash=import_hash(record, seen[identity]),
+        )
+
+
+def import_records(user, records, batch_size=IMPORT_BATCH_SIZE, default_method='OTHER'):
+    """
+    Write a record stream in fixed-size batches, each in its own DB
+    transaction: one query for the hashes already imported, then
+    bulk_create, rollups and change log. Returns a summary dict.
+    If reading fails halfway, the batches already written stay; running
+    the import again skips them.
+    """
+    result = {'read': 0, 'created': 0, 'duplicates': 0, 'errors': 0, 'error_details': []}
+    batch = []
+    for item in normalise(user, records, default_method):
+        if isinstance(item, ImportRowError):
+            result['errors'] += 1
+            if len(result['error_details']) < MAX_REPORTED_ERRORS:
+                result['error_details'].append(str(item))
+            continue
+        result['read'] += 1
+        batch.append(item)
+        if len(batch) >= batch_size:
+            _write_batch(user, batch, result)
+            batch = []
+    if batch:
+        _write_batch(user, batch, result)
+    return result
+
+
+def _write_batch(user, batch, result):
+    with db_transaction.atomic():
+        existing = set(
+            Transaction.objects.filter(user=user, import_hash__in=[tx.import_hash for tx in batch])
+            .values_list('import_hash', flat=True)
+        )
+        fresh = []
+        for tx in batch:
+            if tx.import_hash in existing:
+                result['duplicates'] += 1
+                continue
+            # Also guards against the same hash twice in one batch
+            existing.add(tx.import_hash)
+            fresh.append(tx)
+        Transaction.objects.bulk_create(fresh)
+        # Bulk writes send no post_save
+        rollups.apply_changes([(None, tx) for tx in fresh])
+        changelog.record_changes((tx, True) for tx in fresh)
+    result['created'] += len(fresh)
@@ -0,0 +1,71 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from apps.finance import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark sync pull/push, list, retrieve and mark-paid through the test client '
+        'against a throwaway test database, and optionally compare with a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='Synthetic users to create.')
+        parser.add_argument('--days', type=int, default=365, help='Days of history per user.')
+        parser.add_argument('--iterations', type=int, default=30, help='Requests per scenario.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--baseline', help='Compare against this saved report and fail on regressions.')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Allowed p50 latency growth over the baseline, in percent.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['days'] < 7 or options['iterations'] < 1:
+            raise CommandError('Need at least 1 user, 7 days and 1 iteration.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stderr.write(f"Seeding {options['users']} users x {options['days']} days...")
+            users = benchmark.seed(options['users'], options['days'], options['seed'])
+            self.stderr.write(f"Running {options['iterations']} iterations per scenario...")
+            scenarios = benchmark.run_benchmark(users, options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'users': options['users'],
+                'days': options['days'],
+                'iterations': options['iterations'],
+            },
+            'scenarios': scenarios,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = benchmark.compare(report, baseline, options['threshold'] / 100)
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
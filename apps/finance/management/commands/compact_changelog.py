@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.finance import changelog
+
+
+class Command(BaseCommand):
+    help = 'Drop change log entries superseded by a later entry for the same object.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this user (email).')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = User.objects.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} not found")
+
+        deleted = changelog.compact(users)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} superseded change log entries.'))
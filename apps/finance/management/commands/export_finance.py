@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.finance import export
+
+
+class Command(BaseCommand):
+    help = "Stream a user's transactions, payments and weeks to a file (or stdout) as CSV, NDJSON or columnar NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Owner of the data (email).')
+        parser.add_argument('--output', default='ndjson', choices=list(export.FORMATS))
+        parser.add_argument('--section', action='append', choices=list(export.SECTIONS),
+                            help='Section to export; repeatable. Defaults to all (CSV: transactions).')
+        parser.add_argument('--include-deleted', action='store_true', help='Also export soft-deleted rows.')
+        parser.add_argument('--path', help='Destination file; defaults to stdout.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} not found")
+
+        output = options['output']
+        sections = options['section'] or (['transactions'] if output == 'csv' else list(export.SECTIONS))
+        try:
+            chunks = export.export(user, output, sections, options['include_deleted'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if not options['path']:
+            for chunk in chunks:
+                # Chunks carry their own newlines
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as destination:
+                for chunk in chunks:
+                    destination.write(chunk)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        self.stderr.write(self.style.SUCCESS(f"Exported {', '.join(sections)} to {options['path']}."))
@@ -0,0 +1,30 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.finance import periods
+
+
+class Command(BaseCommand):
+    help = 'Create missing WeeklyPeriods for active users, carrying opening balances forward. Safe to rerun.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this user (email).')
+        parser.add_argument('--until', help='Last day to cover (YYYY-MM-DD); defaults to today.')
+        parser.add_argument('--batch-size', type=int, default=periods.GENERATE_BATCH_SIZE, help='Users per batch.')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = list(User.objects.filter(email=options['user']))
+            if not users:
+                raise CommandError(f"User {options['user']} not found")
+        until = None
+        if options['until']:
+            try:
+                until = date.fromisoformat(options['until'])
+            except ValueError:
+                raise CommandError('--until must be a date (YYYY-MM-DD)')
+
+        result = periods.generate_weeks(users, until, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {result['created']} weeks for {result['users']} users, "
+                                             f"refreshed {result['refreshed']} derived openings."))
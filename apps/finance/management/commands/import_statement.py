@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.finance import importer
+from apps.finance.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV or OFX bank statement as transactions, skipping rows imported before.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file.')
+        parser.add_argument('--user', required=True, help='Owner of the transactions (email).')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Defaults to the file extension.')
+        parser.add_argument('--map', action='append', default=[], metavar='FIELD=COLUMN',
+                            help='CSV column for a field (date, amount, counterparty, description, type, method).')
+        parser.add_argument('--delimiter', default=',', help='CSV delimiter.')
+        parser.add_argument('--date-format', default='%Y-%m-%d', help='CSV date format (strptime).')
+        parser.add_argument('--decimal-comma', action='store_true', help='CSV amounts look like 1.234,56.')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--method', default='OTHER', choices=[code for code, _ in Transaction.METHOD_CHOICES],
+                            help='Method for rows that do not state one.')
+        parser.add_argument('--batch-size', type=int, default=importer.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} not found")
+
+        mapping = {}
+        for item in options['map']:
+            field, _, column = item.partition('=')
+            if field not in importer.DEFAULT_CSV_MAPPING or not column:
+                raise CommandError(f'Invalid --map {item!r}')
+            mapping[field] = column
+
+        file_type = options['format'] or importer.guess_file_type(options['path'])
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                records = importer.read_statement(
+                    stream, file_type, mapping=mapping, delimiter=options['delimiter'],
+                    date_format=options['date_format'], decimal_comma=options['decimal_comma'],
+                )
+                result = importer.import_records(user, records, options['batch_size'], options['method'])
+        except (OSError, UnicodeDecodeError, importer.ImportRowError) as exc:
+            raise CommandError(str(exc))
+
+        for detail in result['error_details']:
+            self.stderr.write(detail)
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {result['read']} rows: {result['created']} created, "
+            f"{result['duplicates']} already imported, {result['errors']} invalid."
+        ))
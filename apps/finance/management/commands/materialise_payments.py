@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.finance import recurrence
+
+
+class Command(BaseCommand):
+    help = 'Create the scheduled payments of recurring templates due within the horizon. Safe to rerun (e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-ahead', type=int, default=recurrence.MATERIALISE_DAYS_AHEAD,
+                            help='Create occurrences due up to this many days from today.')
+        parser.add_argument('--batch-size', type=int, default=recurrence.MATERIALISE_BATCH_SIZE,
+                            help='Templates per transaction.')
+        parser.add_argument('--user', help='Only this user (email).')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = User.objects.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} not found")
+
+        until = timezone.localdate() + timedelta(days=options['days_ahead'])
+        result = recurrence.materialise(until, options['batch_size'], users)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} payments from {result['templates']} templates due by {until.isoformat()}."
+        ))
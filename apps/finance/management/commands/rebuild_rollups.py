@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.finance import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly transaction rollups from scratch, or check them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this user (email).')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report drift without writing; exits with an error if any is found.')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = User.objects.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} not found")
+
+        if options['verify']:
+            drift = rollups.find_drift(users)
+            for (user_id, week, type, method), stored, expected in drift:
+                self.stdout.write(
+                    f"{user_id} {week} {type}/{method}: stored={stored} expected={expected}"
+                )
+            if drift:
+                raise CommandError(f"{len(drift)} rollup buckets drifted")
+            self.stdout.write(self.style.SUCCESS('Rollups match the transaction table.'))
+            return
+
+        written = rollups.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup buckets.'))
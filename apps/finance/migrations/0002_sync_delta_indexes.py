@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklyperiod',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Deleted weeks stay as tombstones; only live weeks are unique
+        migrations.AlterUniqueTogether(
+            name='weeklyperiod',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyperiod',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('user', 'week_start_date'), name='week_user_start_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledpayment',
+            index=models.Index(fields=['user', 'updated_at'], name='payment_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'updated_at'], name='tx_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyperiod',
+            index=models.Index(fields=['user', 'updated_at'], name='week_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_sync_delta_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledpayment',
+            index=models.Index(fields=['user', 'due_date', 'id'], name='payment_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'id'], name='tx_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.functions
+import django.db.models.deletion
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    WeeklyRollup = apps.get_model('finance', 'WeeklyRollup')
+    rows = (
+        Transaction.objects.filter(deleted_at__isnull=True)
+        .annotate(week_start_date=models.functions.TruncWeek('date'))
+        .values('user_id', 'week_start_date', 'type', 'method')
+        .annotate(total=models.Sum('amount'), count=models.Count('id'))
+        .order_by()
+    )
+    WeeklyRollup.objects.bulk_create([WeeklyRollup(**row) for row in rows.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finance', '0003_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField()),
+                ('type', models.CharField(choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')], max_length=10)),
+                ('method', models.CharField(choices=[('TRANSFER', 'Transfer'), ('CASH', 'Cash'), ('CARD', 'Card'), ('OTHER', 'Other')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'week_start_date', 'type', 'method')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
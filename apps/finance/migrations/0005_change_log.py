@@ -0,0 +1,75 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_change_log(apps, schema_editor):
+    SyncCounter = apps.get_model('finance', 'SyncCounter')
+    ChangeLog = apps.get_model('finance', 'ChangeLog')
+    models_by_key = {
+        'transactions': apps.get_model('finance', 'Transaction'),
+        'payments': apps.get_model('finance', 'ScheduledPayment'),
+        'weeks': apps.get_model('finance', 'WeeklyPeriod'),
+    }
+    # One entry per existing row, numbered per user in updated_at order
+    rows = sorted(
+        (
+            (row['user_id'], row['updated_at'], key, row['id'], row['deleted_at'])
+            for key, model in models_by_key.items()
+            for row in model.objects.values('user_id', 'updated_at', 'id', 'deleted_at').iterator()
+        ),
+        key=lambda row: (str(row[0]), row[1]),
+    )
+    counters, entries = {}, []
+    for user_id, _, key, object_id, deleted_at in rows:
+        counters[user_id] = counters.get(user_id, 0) + 1
+        entries.append(ChangeLog(
+            user_id=user_id, seq=counters[user_id], model=key, object_id=object_id,
+            op='delete' if deleted_at else 'create',
+        ))
+    ChangeLog.objects.bulk_create(entries, batch_size=1000)
+    SyncCounter.objects.bulk_create(
+        [SyncCounter(user_id=user_id, seq=seq) for user_id, seq in counters.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finance', '0004_weekly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seq', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('model', models.CharField(choices=[('transactions', 'Transaction'), ('payments', 'Scheduled payment'), ('weeks', 'Weekly period')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('op', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_log', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['user', 'model', 'object_id', 'seq'], name='changelog_object_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='changelog',
+            unique_together={('user', 'seq')},
+        ),
+        migrations.RunPython(populate_change_log, migrations.RunPython.noop),
+    ]
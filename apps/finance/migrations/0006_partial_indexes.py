@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_change_log'),
+    ]
+
+    operations = [
+        # Build the replacements first so the list queries are never unindexed
+        migrations.AddIndex(
+            model_name='scheduledpayment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'due_date', 'id'], name='payment_user_active_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledpayment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('status', 'PENDING')), fields=['user', 'due_date'], name='payment_user_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'date', 'created_at', 'id'], name='tx_user_active_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='scheduledpayment',
+            name='payment_user_due_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='tx_user_date_idx',
+        ),
+    ]
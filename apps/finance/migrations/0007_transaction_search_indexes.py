@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:36
+
+from django.db import migrations
+
+# icontains compiles to UPPER(col::text) LIKE UPPER(%s) on PostgreSQL, so the
+# trigram indexes are built on that expression. Other backends have no
+# trigram support and keep filtering the user's rows found through the
+# (user, ...) indexes.
+TRIGRAM_INDEXES = {
+    'tx_counterparty_trgm_idx': 'counterparty',
+    'tx_description_trgm_idx': 'description',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON finance_transaction '
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_transaction_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('import_hash', ''), _negated=True), fields=['user', 'import_hash'], name='tx_user_import_hash_idx'),
+        ),
+    ]
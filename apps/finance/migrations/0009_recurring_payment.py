@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finance', '0008_transaction_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringPayment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('payee', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('notes', models.TextField(blank=True)),
+                ('expected_method', models.CharField(blank=True, max_length=50)),
+                ('frequency', models.CharField(choices=[('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly'), ('NTH_WEEKDAY', 'Nth weekday of the month')], default='MONTHLY', max_length=12)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('day_of_month', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('week_of_month', models.SmallIntegerField(blank=True, null=True)),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='changelog',
+            name='model',
+            field=models.CharField(choices=[('transactions', 'Transaction'), ('payments', 'Scheduled payment'), ('weeks', 'Weekly period'), ('recurring', 'Recurring payment')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='recurringpayment',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='scheduledpayment',
+            name='recurring',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='finance.recurringpayment'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledpayment',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('recurring', 'due_date'), name='payment_recurring_due_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringpayment',
+            index=models.Index(fields=['user', 'updated_at'], name='recurring_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringpayment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['next_due_date', 'id'], name='recurring_next_due_idx'),
+        ),
+    ]
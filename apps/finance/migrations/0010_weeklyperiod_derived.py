@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_recurring_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklyperiod',
+            name='derived',
+            field=models.BooleanField(default=False),
+        ),
+    ]
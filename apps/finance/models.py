@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 import uuid
 
@@ -7,16 +8,74 @@ class WeeklyPeriod(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='weekly_periods')
     week_start_date = models.DateField()
     opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Created by generate_weeks: the opening is only carried forward, so it
+    # is recomputed on each run and never anchors a balance (see periods.py)
+    derived = models.BooleanField(default=False)
     
+    # Sync fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ('user', 'week_start_date')
+        constraints = [
+            # One live week per start date: a deleted week can be created again
+            models.UniqueConstraint(fields=['user', 'week_start_date'], name='week_user_start_uniq',
+                                    condition=Q(deleted_at__isnull=True)),
+        ]
+        indexes = [
+            # Delta sync: WHERE user = ? AND updated_at > ?
+            models.Index(fields=['user', 'updated_at'], name='week_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.week_start_date} - {self.user.email}"
 
+class RecurringPayment(models.Model):
+    # Template that materialises ScheduledPayments on a schedule (see
+    # recurrence.py and `manage.py materialise_payments`)
+    FREQUENCY_CHOICES = [
+        ('WEEKLY', 'Weekly'),
+        ('MONTHLY', 'Monthly'),
+        ('NTH_WEEKDAY', 'Nth weekday of the month'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recurring_payments')
+    payee = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    notes = models.TextField(blank=True)
+    expected_method = models.CharField(max_length=50, blank=True)
+
+    # Rule: every `interval` weeks or months from start_date, until end_date
+    frequency = models.CharField(max_length=12, choices=FREQUENCY_CHOICES, default='MONTHLY')
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # MONTHLY: day of the month (defaults to start_date's; clamped to the month's length)
+    day_of_month = models.PositiveSmallIntegerField(null=True, blank=True)
+    # NTH_WEEKDAY: weekday (0 = Monday) and its week in the month (1-5, -1 = last)
+    weekday = models.PositiveSmallIntegerField(null=True, blank=True)
+    week_of_month = models.SmallIntegerField(null=True, blank=True)
+    # First occurrence not created yet; null once the rule has ended
+    next_due_date = models.DateField(null=True, blank=True)
+
+    # Sync fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='recurring_user_updated_idx'),
+            # Scheduler: WHERE next_due_date <= ? over live templates
+            models.Index(fields=['next_due_date', 'id'], name='recurring_next_due_idx',
+                         condition=Q(deleted_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.payee} - {self.amount} ({self.frequency})"
+
 class ScheduledPayment(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -32,12 +91,37 @@ class ScheduledPayment(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     expected_method = models.CharField(max_length=50, blank=True)
+    # Template this occurrence was materialised from
+    recurring = models.ForeignKey(
+        RecurringPayment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='occurrences'
+    )
     
     # Sync fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            # One live occurrence per template and date: materialisation reruns
+            # are no-ops, and a rescheduled template can reuse cancelled dates
+            models.UniqueConstraint(fields=['recurring', 'due_date'], name='payment_recurring_due_uniq',
+                                    condition=Q(deleted_at__isnull=True)),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='payment_user_updated_idx'),
+            # Paginated list of live rows: ORDER BY due_date, id
+            models.Index(fields=['user', 'due_date', 'id'], name='payment_user_active_due_idx',
+                         condition=Q(deleted_at__isnull=True)),
+            # Pending payments by due date (upcoming, overdue)
+            models.Index(fields=['user', 'due_date'], name='payment_user_pending_idx',
+                         condition=Q(status='PENDING', deleted_at__isnull=True)),
+        ]
+
     def __str__(self):
         return f"{self.payee} - {self.amount}"
 
@@ -70,10 +154,89 @@ class Transaction(models.Model):
         related_name='transaction'
     )
     
+    # Statement imports: hash of the bank row, used to skip re-imported rows
+    import_hash = models.CharField(max_length=64, blank=True, default='')
+
     # Sync fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='tx_user_updated_idx'),
+            # Import de-duplication: WHERE user = ? AND import_hash IN (...)
+            models.Index(fields=['user', 'import_hash'], name='tx_user_import_hash_idx',
+                         condition=~Q(import_hash='')),
+            # Paginated history and date-range reports over live rows:
+            # ORDER BY date DESC, created_at DESC, id DESC / WHERE date BETWEEN ...
+            # (created_at orders same-day rows as the running balance does)
+            models.Index(fields=['user', 'date', 'created_at', 'id'], name='tx_user_active_date_idx',
+                         condition=Q(deleted_at__isnull=True)),
+        ]
+
     def __str__(self):
         return f"{self.type} - {self.amount} - {self.counterparty}"
+
+class WeeklyRollup(models.Model):
+    # Totals of active transactions per (week, type, method). Maintained
+    # incrementally on every transaction write (see rollups.py); rebuild
+    # with `manage.py rebuild_rollups`.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='weekly_rollups')
+    week_start_date = models.DateField()
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    method = models.CharField(max_length=20, choices=Transaction.METHOD_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'week_start_date', 'type', 'method')
+
+    def __str__(self):
+        return f"{self.week_start_date} {self.type}/{self.method} - {self.total}"
+
+class SyncCounter(models.Model):
+    # Last change sequence number handed out to the user (see changelog.py)
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='sync_counter')
+    seq = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.seq}"
+
+class ChangeLog(models.Model):
+    # One row per write to a synced model, numbered by a gapless per-user
+    # sequence. Superseded rows are dropped by `manage.py compact_changelog`.
+    MODEL_CHOICES = [
+        ('transactions', 'Transaction'),
+        ('payments', 'Scheduled payment'),
+        ('weeks', 'Weekly period'),
+        ('recurring', 'Recurring payment'),
+    ]
+    OP_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='change_log')
+    seq = models.BigIntegerField()
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.UUIDField()
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The unique (user, seq) index also serves WHERE user = ? AND seq > ?
+        unique_together = ('user', 'seq')
+        indexes = [
+            # Compaction: later entries for the same object
+            models.Index(fields=['user', 'model', 'object_id', 'seq'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.seq} {self.op} {self.model}/{self.object_id}"
@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class FinanceCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the finance viewsets.
+    Pages are addressed by an opaque cursor instead of an offset, so fetching
+    page N costs the same as fetching page 1. Each viewset declares its own
+    `cursor_ordering`, backed by a (user, ...) composite index.
+    """
+    page_size = getattr(settings, 'FINANCE_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-updated_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
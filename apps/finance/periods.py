@@ -0,0 +1,156 @@
+"""
+Generation of missing WeeklyPeriod rows with carried-forward balances.
+
+Users are handled in keyset batches. Per batch: one query for the existing
+weeks, one grouped query for the weekly net totals (from the maintained
+WeeklyRollup table), chunked bulk inserts and the change log, however many
+users the batch covers. Weeks the user wrote anchor the chain, as in
+reports.balance_summary:
+
+    opening(week + 1) = opening(week) + net(week)
+
+Generated weeks are marked `derived`: they never anchor, and each run
+recomputes their opening balance, so a backdated write is carried into the
+weeks generated after it. Weeks before a user's first snapshot are derived
+backwards from it, so the snapshot stays consistent with the weeks
+generated before it.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from apps.accounts.models import User
+from . import changelog
+from .models import WeeklyPeriod, WeeklyRollup
+from .rollups import ZERO, week_start
+
+GENERATE_BATCH_SIZE = 500
+# Rows per INSERT, and ids per existence check
+WRITE_BATCH_SIZE = 1000
+WEEK = timedelta(days=7)
+
+
+def generate_weeks(users=None, until=None, batch_size=GENERATE_BATCH_SIZE):
+    """
+    Create every missing week of the given active users (default: all),
+    from their first week with data up to the week of `until` (default
+    today), and refresh the opening balance of the derived ones.
+    Returns {'users': ..., 'created': ..., 'refreshed': ...}.
+    """
+    last_week = week_start(until or timezone.localdate())
+    active = User.objects.filter(is_active=True)
+    if users is not None:
+        active = active.filter(pk__in=[getattr(user, 'pk', user) for user in users])
+    result = {'users': 0, 'created': 0, 'refreshed': 0}
+    last_id = None
+    while True:
+        batch = active.order_by('pk')
+        if last_id is not None:
+            batch = batch.filter(pk__gt=last_id)
+        user_ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            return result
+        last_id = user_ids[-1]
+        result['users'] += len(user_ids)
+        created, refreshed = _generate_batch(user_ids, last_week)
+        result['created'] += created
+        result['refreshed'] += refreshed
+
+
+def _generate_batch(user_ids, last_week):
+    existing = defaultdict(dict)
+    # user -> {week: (id, stored opening)} of the live derived weeks
+    derived = defaultdict(dict)
+    # Deleted weeks free their date, so they are generated again
+    for period_id, user_id, day, opening, is_derived in (
+        WeeklyPeriod.objects.filter(user_id__in=user_ids, week_start_date__lte=last_week, deleted_at__isnull=True)
+        .values_list('id', 'user_id', 'week_start_date', 'opening_balance', 'derived')
+    ):
+        # A week already has a row if any day of it does; only Monday rows
+        # the user wrote give the opening balance of the week
+        monday = day == week_start(day)
+        anchor = opening if monday and not is_derived else None
+        if anchor is not None or week_start(day) not in existing[user_id]:
+            existing[user_id][week_start(day)] = anchor
+        if monday and is_derived:
+            derived[user_id][day] = (period_id, opening)
+
+    net = defaultdict(dict)
+    for user_id, week, income, expense in (
+        WeeklyRollup.objects.filter(user_id__in=user_ids, week_start_date__lte=last_week)
+        .values('user_id', 'week_start_date')
+        .annotate(income=Sum('total', filter=Q(type='INCOME')), expense=Sum('total', filter=Q(type='EXPENSE')))
+        .values_list('user_id', 'week_start_date', 'income', 'expense')
+    ):
+        net[user_id][week] = (income or ZERO) - (expense or ZERO)
+
+    now = timezone.now()
+    periods, stale = [], {}
+    for user_id in user_ids:
+        openings = _carried_openings(existing[user_id], net[user_id], last_week)
+        periods.extend(
+            WeeklyPeriod(user_id=user_id, week_start_date=week, opening_balance=opening, derived=True)
+            for week, opening in openings.items() if week not in existing[user_id]
+        )
+        for week, (period_id, stored) in derived[user_id].items():
+            if openings.get(week, stored) != stored:
+                stale[period_id] = WeeklyPeriod(id=period_id, user_id=user_id, week_start_date=week,
+                                                opening_balance=openings[week], derived=True, updated_at=now)
+
+    with db_transaction.atomic():
+        # Weeks the user wrote to since the read above are theirs now
+        refreshed, stale_ids = [], sorted(stale)
+        for start in range(0, len(stale_ids), WRITE_BATCH_SIZE):
+            chunk = stale_ids[start:start + WRITE_BATCH_SIZE]
+            refreshed.extend(
+                stale[period_id] for period_id in
+                WeeklyPeriod.objects.select_for_update().filter(id__in=chunk, derived=True)
+                .order_by('id').values_list('id', flat=True)
+            )
+        WeeklyPeriod.objects.bulk_update(refreshed, ['opening_balance', 'updated_at'], batch_size=WRITE_BATCH_SIZE)
+
+        WeeklyPeriod.objects.bulk_create(periods, batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True)
+        # Ids are generated client-side; weeks created concurrently (e.g. by
+        # the app) were kept and ours skipped
+        written = set()
+        for start in range(0, len(periods), WRITE_BATCH_SIZE):
+            chunk = [period.id for period in periods[start:start + WRITE_BATCH_SIZE]]
+            written.update(WeeklyPeriod.objects.filter(id__in=chunk).values_list('id', flat=True))
+        # Bulk writes send no post_save
+        changelog.record_changes(
+            [(period, True) for period in periods if period.id in written]
+            + [(period, False) for period in refreshed]
+        )
+    return len(written), len(refreshed)
+
+
+def _carried_openings(existing, net, last_week):
+    """{week: carried opening balance} of one user, from the first week with data to last_week."""
+    weeks = list(existing) + list(net)
+    first_week = min(weeks) if weeks else last_week
+    anchors = sorted(week for week, opening in existing.items() if opening is not None)
+
+    # Walk back from the first snapshot: opening(w) = opening(w + 1) - net(w)
+    openings = {}
+    if anchors:
+        opening = existing[anchors[0]]
+        week = anchors[0] - WEEK
+        while week >= first_week:
+            opening -= net.get(week, ZERO)
+            openings[week] = opening
+            week -= WEEK
+        opening = existing[anchors[0]]
+        week = anchors[0]
+    else:
+        opening, week = ZERO, first_week
+
+    while week <= last_week:
+        if existing.get(week) is not None:
+            opening = existing[week]
+        openings.setdefault(week, opening)
+        opening += net.get(week, ZERO)
+        week += WEEK
+
+    return dict(sorted(openings.items()))
@@ -0,0 +1,177 @@
+"""
+Recurrence rules of RecurringPayment templates and their materialisation
+into ScheduledPayment rows.
+
+A template keeps `next_due_date`, its first occurrence not yet written, so
+finding the work of a run is one indexed range query. Templates are handled
+in keyset batches: per batch one select, one bulk insert, one bulk update of
+the cursors and the change log, whatever the number of users. The
+(recurring, due_date) unique constraint on live rows makes reruns and
+overlapping runs harmless.
+
+Pending occurrences from today on follow their template: edits are copied
+to them, and a rule change or a delete cancels them (soft delete).
+"""
+
+import calendar
+from datetime import date, timedelta
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from . import changelog
+from .models import RecurringPayment, ScheduledPayment
+
+MATERIALISE_BATCH_SIZE = 1000
+# Default horizon: occurrences due within this many days are created
+MATERIALISE_DAYS_AHEAD = 31
+
+
+def _month_date(year, month, template):
+    """The template's day within (year, month), or None if there is none."""
+    days = calendar.monthrange(year, month)[1]
+    if template.frequency == 'MONTHLY':
+        # Day 31 falls on the last day of shorter months
+        return date(year, month, min(template.day_of_month or template.start_date.day, days))
+    first_weekday = calendar.weekday(year, month, 1)
+    if template.week_of_month == -1:
+        day = days - (calendar.weekday(year, month, days) - template.weekday) % 7
+    else:
+        day = 1 + (template.weekday - first_weekday) % 7 + 7 * (template.week_of_month - 1)
+    return date(year, month, day) if day <= days else None
+
+
+def _add_months(year, month, count):
+    index = year * 12 + month - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def occurrences(template, on_or_after):
+    """Yield the template's due dates from `on_or_after`, up to its end date."""
+    start = max(template.start_date, on_or_after)
+    if template.frequency == 'WEEKLY':
+        step = timedelta(weeks=template.interval)
+        # Stay on the start date's weekday and interval grid
+        periods = -(-(start - template.start_date).days // step.days)
+        current = template.start_date + step * periods
+        while template.end_date is None or current <= template.end_date:
+            yield current
+            current += step
+        return
+
+    # Monthly rules: walk the months on the interval grid from start_date
+    year, month = template.start_date.year, template.start_date.month
+    skip = (start.year - year) * 12 + start.month - month
+    year, month = _add_months(year, month, skip - skip % template.interval)
+    while True:
+        current = _month_date(year, month, template)
+        if current is not None and current >= start:
+            if template.end_date is not None and current > template.end_date:
+                return
+            yield current
+        elif current is None and template.end_date is not None and date(year, month, 1) > template.end_date:
+            return
+        year, month = _add_months(year, month, template.interval)
+
+
+def first_due_date(template, on_or_after=None):
+    """Next due date on or after the given day (default start_date); None once the rule has ended."""
+    return next(occurrences(template, on_or_after or template.start_date), None)
+
+
+def materialise(until, batch_size=MATERIALISE_BATCH_SIZE, users=None):
+    """
+    Create the ScheduledPayments of every active template due up to
+    `until` (inclusive). Returns {'templates': ..., 'created': ...}.
+    """
+    due = RecurringPayment.objects.filter(deleted_at__isnull=True, next_due_date__lte=until)
+    if users is not None:
+        due = due.filter(user__in=users)
+    result = {'templates': 0, 'created': 0}
+    last_id = None
+    while True:
+        batch = due.order_by('id')
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return result
+        last_id = batch[-1].id
+        result['templates'] += len(batch)
+        result['created'] += _materialise_batch(batch, until)
+
+
+def _materialise_batch(templates, until):
+    now = timezone.now()
+    payments = []
+    for template in templates:
+        template.updated_at = now
+        dates = occurrences(template, template.next_due_date)
+        for due_date in dates:
+            if due_date > until:
+                template.next_due_date = due_date
+                break
+            payments.append(ScheduledPayment(
+                user_id=template.user_id,
+                recurring=template,
+                payee=template.payee,
+                amount=template.amount,
+                due_date=due_date,
+                notes=template.notes,
+                expected_method=template.expected_method,
+            ))
+        else:
+            template.next_due_date = None
+
+    with db_transaction.atomic():
+        ScheduledPayment.objects.bulk_create(payments, ignore_conflicts=True)
+        # Ids are generated client-side; rows that hit the unique key
+        # (an overlapping run got there first) were not written
+        written = set(
+            ScheduledPayment.objects.filter(id__in=[payment.id for payment in payments]).values_list('id', flat=True)
+        )
+        RecurringPayment.objects.bulk_update(templates, ['next_due_date', 'updated_at'])
+        # Bulk writes send no post_save
+        changelog.record_changes(
+            [(payment, True) for payment in payments if payment.id in written]
+            + [(template, False) for template in templates]
+        )
+    return len(written)
+
+
+# Template fields copied onto the occurrences it creates
+OCCURRENCE_FIELDS = ('payee', 'amount', 'notes', 'expected_method')
+
+
+def _pending(template, today):
+    return list(
+        ScheduledPayment.objects.filter(recurring=template, status='PENDING', deleted_at__isnull=True,
+                                        due_date__gte=today or timezone.localdate())
+        .select_for_update().order_by('id')
+    )
+
+
+def cancel_pending(template, today=None):
+    """Soft-delete the template's pending occurrences due from today on. Returns how many."""
+    now = timezone.now()
+    payments = _pending(template, today)
+    for payment in payments:
+        payment.deleted_at = payment.updated_at = now
+    ScheduledPayment.objects.bulk_update(payments, ['deleted_at', 'updated_at'])
+    # Bulk writes send no post_save
+    changelog.record_changes((payment, False) for payment in payments)
+    return len(payments)
+
+
+def update_pending(template, fields, today=None):
+    """Copy the given OCCURRENCE_FIELDS of the template to its pending occurrences from today on."""
+    fields = [name for name in OCCURRENCE_FIELDS if name in fields]
+    if not fields:
+        return 0
+    now = timezone.now()
+    payments = _pending(template, today)
+    for payment in payments:
+        for name in fields:
+            setattr(payment, name, getattr(template, name))
+        payment.updated_at = now
+    ScheduledPayment.objects.bulk_update(payments, fields + ['updated_at'])
+    changelog.record_changes((payment, False) for payment in payments)
+    return len(payments)
@@ -0,0 +1,19 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets clients negotiate `Accept: application/x-ndjson` on sync pull.
+    Streamed pulls bypass it and write their own lines; it only renders the
+    non-streamed responses (e.g. validation errors) as a single JSON line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        return (encoder.encode(data) + '\n').encode(self.charset)
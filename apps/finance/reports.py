@@ -0,0 +1,196 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from .models import Transaction, WeeklyPeriod, WeeklyRollup
+
+TRUNC_FUNCTIONS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+ZERO = Decimal('0.00')
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period_start(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def balance_summary(user, date_from, date_to, period='week'):
+    """
+    Income, expense, net and closing balance per week or month.
+
+    Balances are chained from WeeklyPeriod.opening_balance snapshots: the
+    latest snapshot on or before the range start seeds the first period and
+    any snapshot that starts exactly on a period boundary re-anchors the
+    chain; weeks generate_weeks derived are skipped. Periods are always
+    whole, so the last one may end after date_to.
+    Totals are grouped in the database, so the work is two queries whatever
+    the size of the history.
+    """
+    start = period_start(date_from, period)
+    date_to = next_period_start(period_start(date_to, period), period) - timedelta(days=1)
+    weeks = WeeklyPeriod.objects.filter(user=user, deleted_at__isnull=True, derived=False)
+
+    # 1. Snapshots in range, plus the latest one at or before the range start
+    seed = weeks.filter(week_start_date__lte=start).order_by('-week_start_date').values('week_start_date')[:1]
+    anchors = dict(
+        weeks.filter(Q(week_start_date__gte=Subquery(seed)) | Q(week_start_date__gte=start),
+                     week_start_date__lte=date_to)
+        .values_list('week_start_date', 'opening_balance')
+    )
+    seed_date = min(anchors) if anchors else None
+    if seed_date is not None and seed_date <= start:
+        opening, totals_from = anchors[seed_date], seed_date
+    else:
+        opening, totals_from = ZERO, start
+
+    # 2. Totals per period. Rows between the seed snapshot and the range start
+    # land in periods before `start` and are folded into the opening balance.
+    totals = {}
+    for bucket, income, expense, count in _period_totals(user, totals_from, date_to, period):
+        income, expense = income or ZERO, expense or ZERO
+        if bucket < start:
+            opening += income - expense
+        else:
+            totals[bucket] = (income, expense, count)
+
+    results = []
+    bucket = start
+    while bucket <= date_to:
+        if bucket in anchors:
+            opening = anchors[bucket]
+        income, expense, count = totals.get(bucket, (ZERO, ZERO, 0))
+        closing = opening + income - expense
+        end = next_period_start(bucket, period)
+        results.append({
+            'period_start': bucket,
+            'period_end': end - timedelta(days=1),
+            'opening_balance': opening,
+            'income': income,
+            'expense': expense,
+            'net': income - expense,
+            'closing_balance': closing,
+            'count': count,
+        })
+        opening = closing
+        bucket = end
+    return results
+
+
+def _period_totals(user, totals_from, date_to, period):
+    """(period start, income, expense, count) rows between two dates."""
+    if period == 'week' and totals_from.weekday() == 0:
+        # Whole weeks: read the maintained rollups, O(weeks) instead of O(rows)
+        return (
+            WeeklyRollup.objects
+            .filter(user=user, week_start_date__gte=totals_from, week_start_date__lte=date_to)
+            .values('week_start_date')
+            .annotate(
+                income=Sum('total', filter=Q(type='INCOME')),
+                expense=Sum('total', filter=Q(type='EXPENSE')),
+                count=Sum('count'),
+            )
+            .order_by('week_start_date')
+            .values_list('week_start_date', 'income', 'expense', 'count')
+        )
+    return (
+        Transaction.objects
+        .filter(user=user, deleted_at__isnull=True, date__gte=totals_from, date__lte=date_to)
+        .annotate(bucket=TRUNC_FUNCTIONS[period]('date'))
+        .values('bucket')
+        .annotate(
+            income=Sum('amount', filter=Q(type='INCOME')),
+            expense=Sum('amount', filter=Q(type='EXPENSE')),
+            count=Count('id'),
+        )
+        .order_by('bucket')
+        .values_list('bucket', 'income', 'expense', 'count')
+    )
+
+
+def _net(queryset, amount):
+    totals = queryset.aggregate(
+        income=Sum(amount, filter=Q(type='INCOME')),
+        expense=Sum(amount, filter=Q(type='EXPENSE')),
+    )
+    return (totals['income'] or ZERO) - (totals['expense'] or ZERO)
+
+
+def opening_balance(user, day):
+    """
+    Balance at the start of `day`: the latest WeeklyPeriod snapshot (not
+    derived) on or before it plus the net since. Whole weeks in between are
+    read from WeeklyRollup, transactions only for the partial weeks at both
+    ends, so the cost does not grow with the time since the snapshot.
+    Three indexed queries at most.
+    """
+    anchor = (
+        WeeklyPeriod.objects.filter(user=user, deleted_at__isnull=True, derived=False, week_start_date__lte=day)
+        .order_by('-week_start_date').values_list('week_start_date', 'opening_balance').first()
+    )
+    transactions = Transaction.objects.filter(user=user, deleted_at__isnull=True, date__lt=day)
+    last_week = period_start(day, 'week')
+    weeks = WeeklyRollup.objects.filter(user=user, week_start_date__lt=last_week)
+    opening, first_week = ZERO, None
+    if anchor is not None:
+        opening = anchor[1]
+        transactions = transactions.filter(date__gte=anchor[0])
+        # First whole week from the snapshot on
+        first_week = period_start(anchor[0] + timedelta(days=6), 'week')
+        weeks = weeks.filter(week_start_date__gte=first_week)
+    if first_week is not None and first_week >= last_week:
+        return opening + _net(transactions, 'amount')
+    partial = Q(date__gte=last_week) | Q(date__lt=first_week) if first_week else Q(date__gte=last_week)
+    return opening + _net(weeks, 'total') + _net(transactions.filter(partial), 'amount')
+
+
+def current_balance(user, day):
+    """Balance at the end of `day` (see opening_balance)."""
+    return opening_balance(user, day + timedelta(days=1))
+
+
+def running_balances(user, ids, date_from, date_to):
+    """
+    {id: balance after the transaction} for the given transactions, all
+    dated within [date_from, date_to] (typically one page of the ledger).
+
+    A window SUM of signed amounts in ledger order (date, created_at, id),
+    partitioned by the WeeklyPeriod snapshot (not derived) each row falls
+    under within the range and added to that snapshot's opening balance;
+    rows before the first such snapshot start from opening_balance(date_from).
+    Only the rows within [date_from, date_to] are read, plus the rollups
+    since the last snapshot, so the cost depends on the page's date span,
+    not on its position in the history or on the generated weeks.
+    """
+    seed = opening_balance(user, date_from)
+    anchor = (
+        WeeklyPeriod.objects.filter(user=user, deleted_at__isnull=True, derived=False,
+                                    week_start_date__gte=date_from, week_start_date__lte=OuterRef('date'))
+        .order_by('-week_start_date')
+    )
+    money = DecimalField(max_digits=14, decimal_places=2)
+    ledger = (
+        Transaction.objects
+        .filter(user=user, deleted_at__isnull=True, date__gte=date_from, date__lte=date_to)
+        .annotate(
+            anchor_date=Subquery(anchor.values('week_start_date')[:1]),
+            signed=Case(When(type='INCOME', then=F('amount')), default=-F('amount'), output_field=money),
+        )
+        .annotate(balance=Coalesce(Subquery(anchor.values('opening_balance')[:1]), Value(seed), output_field=money) + Window(
+            Sum('signed', output_field=money),
+            partition_by=[F('anchor_date')],
+            order_by=[F('date').asc(), F('created_at').asc(), F('id').asc()],
+        ))
+        .values_list('id', 'balance')
+    )
+    wanted = set(ids)
+    return {tx_id: balance.quantize(ZERO) for tx_id, balance in ledger if tx_id in wanted}
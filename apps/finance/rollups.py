@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncWeek
+from .models import Transaction, WeeklyRollup
+
+ZERO = Decimal('0.00')
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def snapshot(tx):
+    """
+    The rollup bucket a transaction counts towards and its amount, or None
+    when it does not count (missing or soft-deleted).
+    """
+    if tx is None or tx.deleted_at is not None:
+        return None
+    return (tx.user_id, week_start(tx.date), tx.type, tx.method), tx.amount
+
+
+def apply_changes(changes):
+    """
+    Fold (before, after) transaction pairs into the rollup table.
+    `before` is a copy taken before the write; either side may be None for
+    creates and deletes. Deltas are merged per bucket first, so the cost is
+    one UPDATE per touched bucket, not per row.
+    Must run inside the transaction that wrote the rows.
+    """
+    deltas = defaultdict(lambda: [ZERO, 0])
+    for before, after in changes:
+        for tx, sign in ((before, -1), (after, 1)):
+            state = snapshot(tx)
+            if state is None:
+                continue
+            key, amount = state
+            deltas[key][0] += sign * amount
+            deltas[key][1] += sign
+
+    for (user_id, week, type, method), (amount, count) in deltas.items():
+        if not amount and not count:
+            continue
+        _apply_delta(user_id, week, type, method, amount, count)
+
+
+def _apply_delta(user_id, week, type, method, amount, count):
+    bucket = WeeklyRollup.objects.filter(user_id=user_id, week_start_date=week, type=type, method=method)
+    if bucket.update(total=F('total') + amount, count=F('count') + count):
+        return
+    try:
+        with db_transaction.atomic():
+            WeeklyRollup.objects.create(
+                user_id=user_id, week_start_date=week, type=type, method=method,
+                total=amount, count=count,
+            )
+    except IntegrityError:
+        # Created concurrently by another writer; add on top of theirs
+        bucket.update(total=F('total') + amount, count=F('count') + count)
+
+
+def computed_rollups(users=None):
+    """Rollup rows recomputed from scratch out of the Transaction table."""
+    queryset = Transaction.objects.filter(deleted_at__isnull=True)
+    if users is not None:
+        queryset = queryset.filter(user__in=users)
+    return (
+        queryset
+        .annotate(week_start_date=TruncWeek('date'))
+        .values('user_id', 'week_start_date', 'type', 'method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def find_drift(users=None):
+    """
+    Compare stored rollups with freshly computed ones.
+    Returns a list of (key, stored, expected) tuples for every mismatch,
+    where stored/expected are (total, count).
+    """
+    expected = {
+        (row['user_id'], row['week_start_date'], row['type'], row['method']): (row['total'], row['count'])
+        for row in computed_rollups(users)
+    }
+    stored_rows = WeeklyRollup.objects.all()
+    if users is not None:
+        stored_rows = stored_rows.filter(user__in=users)
+    stored = {
+        (row['user_id'], row['week_start_date'], row['type'], row['method']): (row['total'], row['count'])
+        for row in stored_rows.values('user_id', 'week_start_date', 'type', 'method', 'total', 'count')
+        if row['count'] or row['total']
+    }
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(set(expected) | set(stored), key=str)
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+def rebuild(users=None, batch_size=1000):
+    """Replace stored rollups with freshly computed ones. Returns rows written."""
+    with db_transaction.atomic():
+        stale = WeeklyRollup.objects.all()
+        if users is not None:
+            stale = stale.filter(user__in=users)
+        stale.delete()
+        rows = [WeeklyRollup(**row) for row in computed_rollups(users).iterator()]
+        WeeklyRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
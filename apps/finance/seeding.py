@@ -0,0 +1,89 @@
+import random
+from decimal import Decimal
+from datetime import timedelta
+
+# Synthetic data used by scripts/reset_and_seed.py and `manage.py bench`.
+
+
+def generate_transactions(start_date, end_date, rng=random):
+    """
+    A realistic year of personal finance activity between two dates: twice
+    monthly salary, rent and internet, plus coffee, lunch, groceries and
+    entertainment with random amounts. Returns dicts with the keys type,
+    amount, date, counterparty, desc and method (~1,500 rows per year).
+    """
+    transactions = []
+    current = start_date
+
+    while current <= end_date:
+        # --- Income (15th and 30th) ---
+        if current.day == 15 or current.day == 30:
+            transactions.append({
+                'type': 'INCOME', 'amount': Decimal("3200.00"), 
+                'date': current, 'counterparty': "Tech Solutions Inc.", 
+                'desc': "Nómina Quincenal", 'method': 'TRANSFER'
+            })
+
+        # --- Fixed Expenses (1st and 5th) ---
+        if current.day == 1:
+            transactions.append({
+                'type': 'EXPENSE', 'amount': Decimal("850.00"), 
+                'date': current, 'counterparty': "Inmobiliaria Central", 
+                'desc': "Renta Mensual", 'method': 'TRANSFER'
+            })
+        if current.day == 5:
+            transactions.append({
+                'type': 'EXPENSE', 'amount': Decimal("60.00"), 
+                'date': current, 'counterparty': "Claro Internet", 
+                'desc': "Servicio Internet", 'method': 'CARD'
+            })
+
+        # --- Variable Daily Expenses ---
+        
+        # 1. Morning Coffee (70% chance)
+        if rng.random() > 0.3:
+            transactions.append({
+                'type': 'EXPENSE', 
+                'amount': Decimal(rng.uniform(3.50, 8.00)).quantize(Decimal("0.01")), 
+                'date': current, 
+                'counterparty': rng.choice(["Starbucks", "Sweet & Coffee", "Juan Valdez", "Cafetería Local"]), 
+                'desc': "Café de la mañana", 
+                'method': 'CARD'
+            })
+
+        # 2. Lunch (Weekdays)
+        if current.weekday() < 5: 
+            transactions.append({
+                'type': 'EXPENSE', 
+                'amount': Decimal(rng.uniform(6.00, 15.00)).quantize(Decimal("0.01")), 
+                'date': current, 
+                'counterparty': rng.choice(["Subway", "KFC", "Restaurante Ejecutivo", "Uber Eats"]), 
+                'desc': "Almuerzo", 
+                'method': 'CASH'
+            })
+
+        # 3. Groceries (Saturdays or Sundays)
+        if current.weekday() == 5: # Saturday
+            transactions.append({
+                'type': 'EXPENSE', 
+                'amount': Decimal(rng.uniform(80.00, 150.00)).quantize(Decimal("0.01")), 
+                'date': current, 
+                'counterparty': "Supermaxi", 
+                'desc': "Mercado Semanal", 
+                'method': 'CARD'
+            })
+
+        # 4. Entertainment/Hobbies (Random ~15% chance)
+        if rng.random() > 0.85:
+            transactions.append({
+                'type': 'EXPENSE', 
+                'amount': Decimal(rng.uniform(20.00, 60.00)).quantize(Decimal("0.01")), 
+                'date': current, 
+                'counterparty': rng.choice(["CineMark", "Steam Games", "Amazon", "Cena Fuera"]), 
+                'desc': "Entretenimiento", 
+                'method': 'CARD'
+            })
+
+        current += timedelta(days=1)
+
+    return transactions
@@ -1,11 +1,37 @@
+import codecs
+import decimal
+from datetime import date
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Transaction, ScheduledPayment, WeeklyPeriod
+from .models import Transaction, ScheduledPayment, WeeklyPeriod, RecurringPayment
+from .importer import DEFAULT_CSV_MAPPING
+from .recurrence import cancel_pending, first_due_date, update_pending
 
 class WeeklyPeriodSerializer(serializers.ModelSerializer):
     class Meta:
         model = WeeklyPeriod
         fields = '__all__'
-        read_only_fields = ['user']
+        read_only_fields = ['user', 'derived']
+
+    def validate_week_start_date(self, value):
+        # `user` is read-only, so DRF skips the uniqueness check; sync push
+        # (no request) checks the whole push at once instead
+        request = self.context.get('request')
+        if request is not None:
+            weeks = WeeklyPeriod.objects.filter(user=request.user, deleted_at__isnull=True, week_start_date=value)
+            if self.instance is not None:
+                weeks = weeks.exclude(pk=self.instance.pk)
+            if weeks.exists():
+                raise serializers.ValidationError('Already exists for this user.')
+        return value
+
+    def validate(self, attrs):
+        # A week the user writes is a snapshot: it anchors from now on
+        attrs['derived'] = False
+        return attrs
 
 class ScheduledPaymentSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -13,7 +39,56 @@ class ScheduledPaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ScheduledPayment
         fields = '__all__'
-        read_only_fields = ['user']
+        read_only_fields = ['user', 'recurring']
+
+class RecurringPaymentSerializer(serializers.ModelSerializer):
+    frequency_display = serializers.CharField(source='get_frequency_display', read_only=True)
+
+    RULE_FIELDS = ('frequency', 'interval', 'start_date', 'end_date', 'day_of_month', 'weekday', 'week_of_month')
+
+    class Meta:
+        model = RecurringPayment
+        fields = '__all__'
+        read_only_fields = ['user', 'next_due_date']
+        extra_kwargs = {'interval': {'min_value': 1}}
+
+    def validate(self, attrs):
+        rule = {name: attrs.get(name, getattr(self.instance, name, None)) for name in self.RULE_FIELDS}
+        if rule['end_date'] and rule['start_date'] and rule['end_date'] < rule['start_date']:
+            raise serializers.ValidationError({'end_date': 'Must not be before start_date.'})
+        if rule['day_of_month'] is not None and not 1 <= rule['day_of_month'] <= 31:
+            raise serializers.ValidationError({'day_of_month': 'Must be between 1 and 31.'})
+        if rule['frequency'] == 'NTH_WEEKDAY':
+            if rule['weekday'] is None or not 0 <= rule['weekday'] <= 6:
+                raise serializers.ValidationError({'weekday': 'Required: 0 (Monday) to 6 (Sunday).'})
+            if rule['week_of_month'] not in (1, 2, 3, 4, 5, -1):
+                raise serializers.ValidationError({'week_of_month': 'Required: 1 to 5, or -1 for the last one.'})
+        return attrs
+
+    @staticmethod
+    def _schedule(instance):
+        # Occurrences are created from today on, never backfilled
+        instance.next_due_date = first_due_date(instance, max(instance.start_date, timezone.localdate()))
+
+    def create(self, validated_data):
+        instance = RecurringPayment(**validated_data)
+        self._schedule(instance)
+        instance.save()
+        return instance
+
+    def update(self, instance, validated_data):
+        changed = {name for name, value in validated_data.items() if getattr(instance, name) != value}
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        if changed.intersection(self.RULE_FIELDS):
+            # Pending occurrences of the old rule go; the new rule's are
+            # created from today on
+            cancel_pending(instance)
+            self._schedule(instance)
+        else:
+            update_pending(instance, changed)
+        instance.save()
+        return instance
 
 class TransactionSerializer(serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_type_display', read_only=True)
@@ -22,4 +97,206 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = '__all__'
-        read_only_fields = ['user']
+        read_only_fields = ['user', 'import_hash']
+
+class UpcomingQuerySerializer(serializers.Serializer):
+    # Window length from today; overdue payments are always included
+    days = serializers.IntegerField(min_value=0, max_value=366, default=7)
+
+class SummaryQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=['week', 'month'], default='week')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must be before date_to')
+        return attrs
+
+class TransactionFilterSerializer(serializers.Serializer):
+    """Query parameters accepted by the transaction list."""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    type = serializers.ChoiceField(choices=Transaction.TYPE_CHOICES, required=False)
+    method = serializers.ChoiceField(choices=Transaction.METHOD_CHOICES, required=False)
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    # true: only rows created from a scheduled payment; false: only the others
+    linked_payment = serializers.BooleanField(default=None, allow_null=True)
+    search = serializers.CharField(required=False, max_length=100)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must be before date_to')
+        if (attrs.get('min_amount') is not None and attrs.get('max_amount') is not None
+                and attrs['min_amount'] > attrs['max_amount']):
+            raise serializers.ValidationError('min_amount must not exceed max_amount')
+        return attrs
+
+class MarkPaidBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+
+class ImportStatementSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    # Defaults to the file extension
+    file_type = serializers.ChoiceField(choices=['csv', 'ofx'], required=False)
+    # CSV only: {"date": "Fecha", "amount": "Importe", ...}
+    mapping = serializers.JSONField(required=False, binary=True)
+    delimiter = serializers.CharField(max_length=1, default=',', trim_whitespace=False)
+    date_format = serializers.CharField(max_length=50, default='%Y-%m-%d')
+    decimal_comma = serializers.BooleanField(default=False)
+    encoding = serializers.CharField(max_length=20, default='utf-8-sig')
+    method = serializers.ChoiceField(choices=Transaction.METHOD_CHOICES, default='OTHER')
+
+    def validate_mapping(self, value):
+        if not isinstance(value, dict) or not all(
+            key in DEFAULT_CSV_MAPPING and isinstance(column, str) for key, column in value.items()
+        ):
+            raise serializers.ValidationError(
+                f"Expected an object mapping {', '.join(DEFAULT_CSV_MAPPING)} to column names."
+            )
+        return value
+
+    def validate_encoding(self, value):
+        try:
+            codecs.lookup(value)
+        except LookupError:
+            raise serializers.ValidationError('Unknown encoding.')
+        return value
+
+class BalanceSummarySerializer(serializers.Serializer):
+    period_start = serializers.DateField()
+    period_end = serializers.DateField()
+    opening_balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+    income = serializers.DecimalField(max_digits=14, decimal_places=2)
+    expense = serializers.DecimalField(max_digits=14, decimal_places=2)
+    net = serializers.DecimalField(max_digits=14, decimal_places=2)
+    closing_balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class FastReadSerializer:
+    """
+    Read-only twin of a ModelSerializer for large read paths (sync pull,
+    list endpoints). It renders the dicts returned by `.values()` directly,
+    with one precomputed converter per field and `get_*_display` resolved
+    through a label map, skipping model instances and per-field dispatch.
+    Output matches the ModelSerializer it was built from; use
+    `fast_serializer()` to get the cached instance for a serializer class.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.plan = []
+        columns = []
+        for name, field in serializer.fields.items():
+            if getattr(field, 'write_only', False):
+                continue
+            source = field.source
+            if source.startswith('get_') and source.endswith('_display'):
+                column = source[len('get_'):-len('_display')]
+                labels = {key: str(label) for key, label in model._meta.get_field(column).flatchoices}
+                self.plan.append((name, column, 'label', labels))
+            else:
+                column = source
+                self.plan.append((name, column, self._kind(name, field), field))
+            if column not in columns:
+                columns.append(column)
+        self.columns = tuple(columns)
+
+    @staticmethod
+    def _kind(name, field):
+        if isinstance(field, serializers.UUIDField):
+            return 'str'
+        if isinstance(field, serializers.DecimalField):
+            return 'decimal'
+        if isinstance(field, serializers.DateTimeField):
+            return 'datetime'
+        if isinstance(field, serializers.DateField):
+            return 'date'
+        if isinstance(field, (serializers.PrimaryKeyRelatedField, serializers.ChoiceField,
+                              serializers.IntegerField, serializers.BooleanField)):
+            return 'raw'
+        if isinstance(field, serializers.CharField):
+            return 'str'
+        raise ImproperlyConfigured(f'No fast path for {type(field).__name__} field {name!r}')
+
+    def _converters(self):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+        def to_datetime(value):
+            if tz is not None:
+                value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+            value = value.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        def to_decimal(field):
+            exponent = decimal.Decimal('.1') ** field.decimal_places
+            context = decimal.getcontext().copy()
+            context.prec = field.max_digits
+            rounding = field.rounding
+
+            def convert(value):
+                if not isinstance(value, decimal.Decimal):
+                    value = decimal.Decimal(str(value).strip())
+                return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+            return convert
+
+        converters = []
+        for name, column, kind, extra in self.plan:
+            if kind == 'label':
+                convert = (lambda labels: lambda value: labels.get(value, value))(extra)
+            elif kind == 'decimal':
+                convert = to_decimal(extra)
+            elif kind == 'datetime':
+                convert = to_datetime
+            elif kind == 'date':
+                convert = date.isoformat
+            elif kind == 'str':
+                convert = str
+            else:
+                convert = None
+            converters.append((name, column, convert))
+        return converters
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def serialize(self, rows):
+        """Render an iterable of `.values(*self.columns)` dicts."""
+        converters = self._converters()
+        return [
+            {
+                name: (row[column] if convert is None or row[column] is None else convert(row[column]))
+                for name, column, convert in converters
+            }
+            for row in rows
+        ]
+
+    def serialize_compact(self, rows):
+        """
+        Columnar rendering for compact sync pulls: returns (field names,
+        one value list per row). Display labels are left out; clients map
+        codes through `.labels` instead.
+        """
+        converters = [
+            converter for converter, (_, _, kind, _) in zip(self._converters(), self.plan) if kind != 'label'
+        ]
+        fields = [name for name, _, _ in converters]
+        return fields, [
+            [row[column] if convert is None or row[column] is None else convert(row[column])
+             for _, column, convert in converters]
+            for row in rows
+        ]
+
+    @property
+    def labels(self):
+        """{column: {code: label}} for every display field."""
+        return {column: labels for _, column, kind, labels in self.plan if kind == 'label'}
+
+
+@lru_cache(maxsize=None)
+def fast_serializer(serializer_class):
+    return FastReadSerializer(serializer_class)
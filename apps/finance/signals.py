@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from .changelog import MODELS, record_changes
+
+
+def log_save(sender, instance, created, raw=False, **kwargs):
+    # Single-row saves from anywhere (API, admin, scripts) land in the change
+    # log; bulk writes call record_changes() themselves.
+    if not raw:
+        record_changes([(instance, created)])
+
+
+for model in MODELS.values():
+    post_save.connect(log_save, sender=model, dispatch_uid=f'changelog_{model.__name__}')
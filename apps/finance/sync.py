@@ -0,0 +1,371 @@
+import copy
+import json
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Transaction, ScheduledPayment, WeeklyPeriod
+from .serializers import (
+    TransactionSerializer, ScheduledPaymentSerializer, WeeklyPeriodSerializer, fast_serializer,
+)
+from . import changelog, rollups
+
+# A row written by a DB transaction that started before a cursor was issued
+# can commit with an updated_at slightly older than that cursor. Every cursor
+# is pulled back by this window so those rows are picked up on the next pull;
+# clients upsert by id, so receiving a row twice is harmless.
+CURSOR_OVERLAP = timedelta(seconds=getattr(settings, 'SYNC_CURSOR_OVERLAP_SECONDS', 5))
+
+
+def parse_since(value):
+    """
+    Parse the `since` cursor sent by the client.
+    Returns an aware datetime, or None if the value is not a valid timestamp.
+    """
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        return None
+    if since is None:
+        return None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since
+
+
+def issue_cursor(now=None):
+    """
+    Cursor the client must send back as `since` on its next pull.
+    It is derived from the server clock only, so client clock skew never
+    causes rows to be skipped.
+    """
+    now = now or timezone.now()
+    return (now - CURSOR_OVERLAP).isoformat()
+
+
+def parse_seq(value):
+    """Parse the `seq` cursor sent by the client; None if it is not a non-negative integer."""
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+
+def changed_since(queryset, since):
+    # Soft-deleted rows are kept on purpose: they are the tombstones that tell
+    # the client to drop its local copy.
+    return queryset.filter(updated_at__gt=since)
+
+
+def wants_diagnostics(request):
+    """
+    Pull diagnostics are opt-in: staff users get them with ?diagnostics=1,
+    anyone can ask for them with the X-Sync-Diagnostics: 1 header. They only
+    describe the caller's own pull.
+    """
+    if request.META.get('HTTP_X_SYNC_DIAGNOSTICS') == '1':
+        return True
+    return request.user.is_staff and request.query_params.get('diagnostics') == '1'
+
+
+STREAM_CHUNK_SIZE = getattr(settings, 'SYNC_STREAM_CHUNK_SIZE', 500)
+
+
+def wants_stream(request):
+    # Opt in with ?stream=1 or by negotiating the NDJSON renderer
+    accepted = getattr(request, 'accepted_renderer', None)
+    return request.query_params.get('stream') in ('1', 'true') or getattr(accepted, 'format', None) == 'ndjson'
+
+
+def stream_pull(sections, cursor, chunk_size=STREAM_CHUNK_SIZE, seq=None):
+    """
+    Yield a pull as NDJSON: one {"kind": <key>, "data": <row>} line per row,
+    then a final {"kind": "meta", "cursor": ..., "seq": ...} line. The
+    cursors come last so a client only advances them after receiving the
+    whole stream.
+
+    `sections` is a sequence of (key, queryset, serializer_class). Rows are
+    read with .iterator() and flushed every `chunk_size` rows, so memory is
+    bounded by the chunk size rather than by the history size.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for key, queryset, serializer_class in sections:
+        fast = fast_serializer(serializer_class)
+        chunk = []
+        for row in fast.values(queryset).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _ndjson_lines(encoder, key, fast.serialize(chunk))
+                chunk = []
+        if chunk:
+            yield _ndjson_lines(encoder, key, fast.serialize(chunk))
+    meta = {'kind': 'meta', 'cursor': cursor}
+    if seq is not None:
+        meta['seq'] = seq
+    yield json.dumps(meta) + '\n'
+
+
+def _ndjson_lines(encoder, key, rows):
+    return ''.join(encoder.encode({'kind': key, 'data': row}) + '\n' for row in rows)
+
+
+def wants_compact(request):
+    return request.query_params.get('compact') in ('1', 'true')
+
+
+def compact_pull(sections):
+    """
+    Columnar pull body: {"fields": [...], "rows": [[...], ...]} per section,
+    so keys are sent once instead of once per row, and a "labels" lookup
+    table ({section: {column: {code: label}}}) instead of the *_display
+    values on every row.
+    """
+    data, labels = {}, {}
+    for key, queryset, serializer_class in sections:
+        fast = fast_serializer(serializer_class)
+        fields, rows = fast.serialize_compact(fast.values(queryset))
+        data[key] = {'fields': fields, 'rows': rows}
+        if fast.labels:
+            labels[key] = fast.labels
+    data['labels'] = labels
+    return data
+
+
+# Keys the client keeps on its local rows that are not model fields
+CLIENT_ONLY_FIELDS = ('is_synced', 'type_display', 'method_display', 'status_display')
+
+PUSH_BATCH_SIZE = 500
+
+
+class PushSpec:
+    def __init__(self, key, model, serializer_class, unique_fields=(), related_fields=(), on_write=None):
+        self.key = key
+        self.model = model
+        self.serializer_class = serializer_class
+        # Fields that must be unique among the user's live rows, checked for
+        # the whole push at once (soft-deleted rows give their value up).
+        self.unique_fields = unique_fields
+        # Foreign keys resolved for the whole push in one query, among the
+        # user's own rows, instead of one lookup (plus one uniqueness query
+        # for one-to-one links) per item in the serializer.
+        self.related_fields = related_fields
+        # Called with the (before, after) instance pairs once rows are written;
+        # `before` is None for inserts.
+        self.on_write = on_write
+
+
+# Payments go first so transactions pushed in the same batch can link them.
+PUSH_SPECS = (
+    PushSpec('payments', ScheduledPayment, ScheduledPaymentSerializer),
+    PushSpec('weeks', WeeklyPeriod, WeeklyPeriodSerializer, unique_fields=('week_start_date',)),
+    PushSpec('transactions', Transaction, TransactionSerializer, related_fields=('linked_payment',),
+             on_write=rollups.apply_changes),
+)
+
+
+def apply_push(user, data):
+    """
+    Validate and write a sync push payload.
+    Every model is split into inserts and updates with a single id lookup and
+    written with bulk_create/bulk_update, all inside one DB transaction.
+    Returns per-item results keyed like the payload.
+    """
+    results = {}
+    with db_transaction.atomic():
+        for spec in PUSH_SPECS:
+            items = data.get(spec.key) or []
+            if not isinstance(items, list):
+                raise ValidationError({spec.key: ['Expected a list of items.']})
+            results[spec.key] = _push_items(user, spec, items)
+    return results
+
+
+def apply_bulk(user, key, items, mode, all_or_nothing=True):
+    """
+    Bulk create (mode='create') or partially update (mode='update') rows of
+    one synced model through the push engine, in one DB transaction.
+    With `all_or_nothing`, a single invalid item means nothing is written and
+    the valid items are reported as 'skipped'.
+    """
+    spec = next(spec for spec in PUSH_SPECS if spec.key == key)
+    with db_transaction.atomic():
+        return _push_items(user, spec, items, mode=mode, all_or_nothing=all_or_nothing)
+
+
+def _result(obj_id, status, errors=None):
+    result = {'id': obj_id, 'status': status}
+    if errors is not None:
+        result['errors'] = errors
+    return result
+
+
+def _parse_id(value, generate=True):
+    if value in (None, ''):
+        return uuid.uuid4() if generate else None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _load_related(user, field, name, items):
+    """{id: row} of the user's rows referenced by `name` anywhere in the push."""
+    ids = {
+        _parse_id(item.get(name), generate=False)
+        for item in items if isinstance(item, dict) and item.get(name) not in (None, '')
+    }
+    ids.discard(None)
+    return field.queryset.model.objects.filter(user=user).in_bulk(list(ids)) if ids else {}
+
+
+def _reject_taken(queryset, field, valid, results, message, live=False):
+    """
+    Drop the valid entries whose `field` value is taken; returns the rest.
+    With `live`, rows the push soft-deletes hold no value (`queryset` is
+    then expected to cover live rows only).
+    """
+    def deleted(instance, validated):
+        return live and validated.get('deleted_at', getattr(instance, 'deleted_at', None)) is not None
+
+    values = {validated[field] for _, _, _, validated in valid if validated.get(field) is not None}
+    # Rows of the push that set the field give up their stored value; the
+    # others keep it, so it stays taken
+    taken = set(
+        queryset.filter(**{f'{field}__in': values})
+        .exclude(id__in=[obj_id for _, obj_id, instance, validated in valid
+                         if field in validated or deleted(instance, validated)])
+        .values_list(field, flat=True)
+    ) if values else set()
+    accepted = []
+    for entry in valid:
+        position, obj_id, instance, validated = entry
+        # Related rows compare by primary key, as values_list() returns them
+        value = getattr(validated.get(field), 'pk', validated.get(field))
+        if deleted(instance, validated):
+            value = None
+        if value is not None and value in taken:
+            results[position] = _result(str(obj_id), 'error', {field: [message]})
+            continue
+        if value is not None:
+            taken.add(value)
+        accepted.append(entry)
+    return accepted
+
+
+def _push_items(user, spec, items, mode='upsert', all_or_nothing=False):
+    """
+    mode: 'upsert' (sync push: create or fully update by id), 'create'
+    (ids must be new) or 'update' (partial, ids must exist).
+    """
+    model = spec.model
+    serializer = spec.serializer_class(partial=mode == 'update')
+
+    parsed_ids = [
+        _parse_id(item.get('id'), generate=mode != 'update') if isinstance(item, dict) else None
+        for item in items
+    ]
+    existing = model.objects.in_bulk([obj_id for obj_id in parsed_ids if obj_id is not None])
+    related = {
+        name: _load_related(user, serializer.fields[name], name, items) for name in spec.related_fields
+    }
+
+    # 1. Validate every item; results keep the payload order
+    results, valid = [], []
+    seen_ids = set()
+    for item, obj_id in zip(items, parsed_ids):
+        if not isinstance(item, dict):
+            results.append(_result(None, 'error', {'non_field_errors': ['Expected an object.']}))
+            continue
+        if obj_id is None:
+            message = 'This field is required.' if item.get('id') in (None, '') else 'Must be a valid UUID.'
+            results.append(_result(item.get('id'), 'error', {'id': [message]}))
+            continue
+        if obj_id in seen_ids:
+            results.append(_result(str(obj_id), 'error', {'id': ['Duplicated in this push.']}))
+            continue
+        seen_ids.add(obj_id)
+
+        instance = existing.get(obj_id)
+        if (instance is not None and instance.user_id != user.pk) or (instance is None and mode == 'update'):
+            results.append(_result(str(obj_id), 'error', {'id': ['Not found.']}))
+            continue
+        if instance is not None and mode == 'create':
+            results.append(_result(str(obj_id), 'error', {'id': ['Already exists.']}))
+            continue
+
+        payload = {k: v for k, v in item.items() if k not in CLIENT_ONLY_FIELDS}
+        links, errors = {}, {}
+        for name, targets in related.items():
+            if name not in payload:
+                continue
+            value = payload.pop(name)
+            target = targets.get(_parse_id(value, generate=False)) if value not in (None, '') else None
+            if value not in (None, '') and target is None:
+                field = serializer.fields[name]
+                errors[name] = [field.error_messages['does_not_exist'].format(pk_value=value)]
+            links[name] = target
+        serializer.instance = instance
+        try:
+            validated = serializer.run_validation(payload)
+        except ValidationError as exc:
+            errors = {**exc.detail, **errors}
+        if errors:
+            results.append(_result(str(obj_id), 'error', errors))
+            continue
+        validated.update(links)
+        results.append(None)
+        valid.append((len(results) - 1, obj_id, instance, validated))
+
+    # 2. Unique values: one query per field for values already taken by rows
+    # outside this push, plus duplicates inside the push itself
+    for field in spec.unique_fields:
+        valid = _reject_taken(model.objects.filter(user=user, deleted_at__isnull=True), field, valid, results,
+                              'Already exists for this user.', live=True)
+    for field in spec.related_fields:
+        if model._meta.get_field(field).one_to_one:
+            # A payment can back a single transaction, whoever owns it
+            valid = _reject_taken(model.objects.all(), field, valid, results, 'Already linked to another row.')
+
+    if all_or_nothing and len(valid) < len(results):
+        for position, obj_id, _, _ in valid:
+            results[position] = _result(str(obj_id), 'skipped')
+        return results
+
+    # 3. Write
+    now = timezone.now()
+    to_create, to_update, writes = [], [], []
+    # Fields set by the push, including those the serializer's validate() adds
+    updated_fields = set()
+    for position, obj_id, instance, validated in valid:
+        if instance is None:
+            instance = model(id=obj_id, user=user, **validated)
+            to_create.append(instance)
+            writes.append((None, instance))
+            results[position] = _result(str(obj_id), 'created')
+        else:
+            writes.append((copy.copy(instance), instance))
+            for attr, value in validated.items():
+                setattr(instance, attr, value)
+            updated_fields.update(validated)
+            # bulk_update() skips auto_now, and delta sync depends on it
+            instance.updated_at = now
+            to_update.append(instance)
+            results[position] = _result(str(obj_id), 'updated')
+
+    # Updates first: values they release (a deleted week, a moved link) are
+    # free by the time the inserts take them
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(updated_fields) + ['updated_at'], batch_size=PUSH_BATCH_SIZE)
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=PUSH_BATCH_SIZE)
+    if writes:
+        # Bulk writes send no post_save, so they are logged here
+        changelog.record_changes((after, before is None) for before, after in writes)
+        if spec.on_write:
+            spec.on_write(writes)
+    return results
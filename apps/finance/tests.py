@@ -1,9 +1,35 @@
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import mock
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from .models import Transaction, ScheduledPayment, WeeklyPeriod
+from rest_framework.renderers import JSONRenderer
+from core.metrics import registry as metrics_registry
+from rest_framework.test import APIClient
+from .models import (
+    Transaction, ScheduledPayment, WeeklyPeriod, WeeklyRollup, SyncCounter, ChangeLog, RecurringPayment,
+)
+from .reports import balance_summary
+from . import benchmark, changelog, export, importer, periods, recurrence, reports, rollups, views
+from .cache import invalidate_upcoming
+from .serializers import (
+    TransactionSerializer, ScheduledPaymentSerializer, WeeklyPeriodSerializer, fast_serializer,
+)
+from .sync import stream_pull
 from decimal import Decimal
+import csv
 import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import uuid
 
 User = get_user_model()
 
@@ -155,3 +181,1717 @@ class FinanceUseCaseTests(TestCase):
         # Django validation doesn't auto-run on save(), but models define choices.
         # This test ensures our codebase constants match expectations.
         self.assertNotIn('BITCOIN', [c[0] for c in Transaction.METHOD_CHOICES])
+
+
+class SyncPullTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='syncuser',
+            email='sync@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+        self.long_ago = timezone.now() - datetime.timedelta(days=30)
+
+    def _tx(self, **kwargs):
+        defaults = dict(user=self.user, type='EXPENSE', amount=Decimal('10.00'),
+                        date=self.today, counterparty='Shop', method='CASH')
+        defaults.update(kwargs)
+        return Transaction.objects.create(**defaults)
+
+    def _pull(self, since):
+        return self.client.get('/api/sync/pull/', {'since': since})
+
+    # --- USE CASE 8: Delta pull only returns rows changed after the cursor ---
+    def test_pull_returns_only_changed_rows(self):
+        old = self._tx(counterparty='Old')
+        Transaction.objects.filter(id=old.id).update(updated_at=self.long_ago)
+        new = self._tx(counterparty='New')
+
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        response = self._pull(since)
+
+        self.assertEqual(response.status_code, 200)
+        ids = [row['id'] for row in response.data['transactions']]
+        self.assertEqual(ids, [str(new.id)])
+
+    # --- USE CASE 9: Soft-deleted rows travel as tombstones ---
+    def test_pull_includes_tombstones(self):
+        tx = self._tx()
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+
+        response = self.client.delete(f'/api/transactions/{tx.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(Transaction.objects.filter(id=tx.id).exists())
+
+        rows = self._pull(since).data['transactions']
+        self.assertEqual(len(rows), 1)
+        self.assertIsNotNone(rows[0]['deleted_at'])
+
+    # --- USE CASE 10: The server-issued cursor drives the next pull ---
+    def test_pull_cursor_round_trip(self):
+        self._tx()
+        first = self._pull('1970-01-01T00:00:00Z')
+        self.assertEqual(len(first.data['transactions']), 1)
+
+        # Nothing changed, so pulling from the old rows' perspective is empty
+        Transaction.objects.update(updated_at=self.long_ago)
+        second = self._pull(first.data['cursor'])
+        self.assertEqual(second.data['transactions'], [])
+        self.assertEqual(second.data['payments'], [])
+        self.assertEqual(second.data['weeks'], [])
+
+    # --- USE CASE 20: Pull costs one version query plus one per table, whatever the data size ---
+    def test_pull_query_count_is_fixed(self):
+        for _ in range(5):
+            self._tx()
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        Transaction.objects.create(user=other, type='INCOME', amount=Decimal('1.00'),
+                                   date=self.today, counterparty='Other', method='CASH')
+
+        with self.assertNumQueries(4):
+            response = self._pull('1970-01-01T00:00:00Z')
+        self.assertNotIn('diagnostics', response.data)
+        self.assertNotIn('debug_info', response.data)
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'},
+                                       HTTP_X_SYNC_DIAGNOSTICS='1')
+        self.assertEqual(response.data['diagnostics']['counts']['transactions'], 5)
+
+    def test_pull_diagnostics_param_is_staff_only(self):
+        params = {'since': '1970-01-01T00:00:00Z', 'diagnostics': '1'}
+        self.assertNotIn('diagnostics', self.client.get('/api/sync/pull/', params).data)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIn('diagnostics', self.client.get('/api/sync/pull/', params).data)
+
+    def test_pull_rejects_invalid_since(self):
+        self.assertEqual(self._pull('yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/sync/pull/').status_code, 400)
+
+
+class SyncPushTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='pushuser',
+            email='push@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+
+    def _tx_payload(self, **kwargs):
+        payload = {
+            'id': str(uuid.uuid4()), 'type': 'EXPENSE', 'amount': '12.50',
+            'date': str(self.today), 'counterparty': 'Shop', 'method': 'CARD',
+            'is_synced': 0, 'type_display': 'Expense', 'method_display': 'Card',
+        }
+        payload.update(kwargs)
+        return payload
+
+    def _push(self, **data):
+        return self.client.post('/api/sync/push/', data, format='json')
+
+    # --- USE CASE 11: Push creates and updates in one round ---
+    def test_push_creates_and_updates(self):
+        existing = Transaction.objects.create(
+            user=self.user, type='EXPENSE', amount=Decimal('1.00'),
+            date=self.today, counterparty='Before', method='CASH'
+        )
+        payment_id = str(uuid.uuid4())
+        response = self._push(
+            payments=[{'id': payment_id, 'payee': 'Rent', 'amount': '800.00',
+                       'due_date': str(self.today), 'status_display': 'Pending'}],
+            transactions=[
+                self._tx_payload(id=str(existing.id), counterparty='After', amount='2.00'),
+                self._tx_payload(linked_payment=payment_id),
+            ],
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'sync complete')
+        statuses = [r['status'] for r in response.data['results']['transactions']]
+        self.assertEqual(statuses, ['updated', 'created'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.counterparty, 'After')
+        self.assertEqual(existing.amount, Decimal('2.00'))
+        self.assertTrue(Transaction.objects.filter(linked_payment_id=payment_id).exists())
+
+    # --- USE CASE 12: Invalid items are reported without dropping the rest ---
+    def test_push_reports_per_item_errors(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        foreign = Transaction.objects.create(
+            user=other, type='INCOME', amount=Decimal('5.00'),
+            date=self.today, counterparty='Theirs', method='CASH'
+        )
+        response = self._push(transactions=[
+            self._tx_payload(amount='not-a-number'),
+            self._tx_payload(id=str(foreign.id)),
+            self._tx_payload(id='not-a-uuid'),
+            self._tx_payload(),
+        ])
+
+        results = response.data['results']['transactions']
+        self.assertEqual([r['status'] for r in results], ['error', 'error', 'error', 'created'])
+        self.assertIn('amount', results[0]['errors'])
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.counterparty, 'Theirs')
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_push_rejects_duplicate_week(self):
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=self.today)
+        response = self._push(weeks=[
+            {'id': str(uuid.uuid4()), 'week_start_date': str(self.today), 'opening_balance': '10.00'},
+        ])
+        self.assertEqual(response.data['results']['weeks'][0]['status'], 'error')
+        self.assertEqual(WeeklyPeriod.objects.filter(user=self.user).count(), 1)
+
+    # --- USE CASE 13: Query count does not grow with the batch size ---
+    def test_push_query_count_is_flat(self):
+        def queries_for(n):
+            payload = [self._tx_payload() for _ in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self._push(transactions=payload)
+            return len(ctx.captured_queries)
+
+        queries_for(1)  # creates the rollup bucket for today
+        self.assertEqual(queries_for(5), queries_for(40))
+
+    def test_linked_push_query_count_is_flat(self):
+        payments = ScheduledPayment.objects.bulk_create([
+            ScheduledPayment(user=self.user, payee=f'Bill {i}', amount=Decimal('10.00'), due_date=self.today)
+            for i in range(46)
+        ])
+        unused = iter(payments)
+
+        def queries_for(n):
+            payload = [self._tx_payload(linked_payment=str(next(unused).id)) for _ in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._push(transactions=payload)
+            self.assertEqual({r['status'] for r in response.data['results']['transactions']}, {'created'})
+            return len(ctx.captured_queries)
+
+        queries_for(1)  # creates the rollup bucket for today
+        self.assertEqual(queries_for(5), queries_for(40))
+
+    def test_push_rejects_taken_foreign_and_duplicate_links(self):
+        other = User.objects.create_user(username='linkother', email='linkother@example.com', password='x')
+        foreign = ScheduledPayment.objects.create(user=other, payee='Theirs', amount=Decimal('1.00'), due_date=self.today)
+        taken = ScheduledPayment.objects.create(user=self.user, payee='Paid', amount=Decimal('1.00'), due_date=self.today)
+        Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('1.00'), date=self.today,
+                                   counterparty='Paid', method='CASH', linked_payment=taken)
+        free = ScheduledPayment.objects.create(user=self.user, payee='Free', amount=Decimal('1.00'), due_date=self.today)
+
+        response = self._push(transactions=[
+            self._tx_payload(linked_payment=str(foreign.id)),
+            self._tx_payload(linked_payment=str(taken.id)),
+            self._tx_payload(linked_payment=str(free.id)),
+            self._tx_payload(linked_payment=str(free.id)),
+            self._tx_payload(linked_payment=None),
+        ])
+        results = response.data['results']['transactions']
+        self.assertEqual([r['status'] for r in results], ['error', 'error', 'created', 'error', 'created'])
+        self.assertIn('linked_payment', results[0]['errors'])
+        self.assertEqual(Transaction.objects.filter(linked_payment=free).count(), 1)
+
+    def test_push_keeps_link_of_rows_that_omit_it(self):
+        payment = ScheduledPayment.objects.create(user=self.user, payee='Rent', amount=Decimal('1.00'),
+                                                  due_date=self.today)
+        linked = Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('1.00'), date=self.today,
+                                            counterparty='Rent', method='CASH', linked_payment=payment)
+        # The existing row keeps its link (field omitted); the new one cannot take it
+        payload = self._tx_payload(amount='2.00')
+        payload.pop('linked_payment', None)
+        response = self._push(transactions=[
+            {**payload, 'id': str(linked.id)},
+            self._tx_payload(linked_payment=str(payment.id)),
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']['transactions']
+        self.assertEqual([r['status'] for r in results], ['updated', 'error'])
+        linked.refresh_from_db()
+        self.assertEqual((linked.amount, linked.linked_payment_id), (Decimal('2.00'), payment.id))
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='pageuser',
+            email='page@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, type='EXPENSE', amount=Decimal('1.00'),
+                        date=self.today - datetime.timedelta(days=i % 10),
+                        counterparty=f'Shop {i}', method='CASH')
+            for i in range(25)
+        ])
+
+    # --- USE CASE 14: Following cursors walks the whole history once ---
+    def test_transactions_cursor_walk(self):
+        seen = []
+        url = '/api/transactions/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 10)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_transactions_newest_first(self):
+        rows = self.client.get('/api/transactions/').data['results']
+        dates = [row['date'] for row in rows]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_weeks_and_payments_paginate(self):
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=self.today)
+        ScheduledPayment.objects.create(user=self.user, payee='Rent', amount=Decimal('5.00'), due_date=self.today)
+        for url in ('/api/weeks/', '/api/payments/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 1)
+            self.assertIsNone(response.data['next'])
+
+
+class BalanceSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='summaryuser',
+            email='summary@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.monday = datetime.date(2025, 3, 3)
+
+    def _tx(self, type, amount, date):
+        return Transaction.objects.create(
+            user=self.user, type=type, amount=Decimal(amount),
+            date=date, counterparty='X', method='CASH'
+        )
+
+    # --- USE CASE 15: Weekly balances chain from the opening snapshot ---
+    def test_weekly_summary_chains_balances(self):
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=self.monday, opening_balance=Decimal('1000.00'))
+        self._tx('INCOME', '500.00', self.monday + datetime.timedelta(days=1))
+        self._tx('EXPENSE', '200.00', self.monday + datetime.timedelta(days=2))
+        self._tx('EXPENSE', '50.00', self.monday + datetime.timedelta(days=8))
+        deleted = self._tx('EXPENSE', '999.00', self.monday + datetime.timedelta(days=8))
+        deleted.deleted_at = timezone.now()
+        deleted.save()
+        # Rows were written straight through the ORM, bypassing the rollups
+        rollups.rebuild([self.user])
+
+        response = self.client.get('/api/weeks/summary/', {
+            'date_from': str(self.monday),
+            'date_to': str(self.monday + datetime.timedelta(days=13)),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data['results']
+        self.assertEqual(first['opening_balance'], '1000.00')
+        self.assertEqual(first['net'], '300.00')
+        self.assertEqual(first['closing_balance'], '1300.00')
+        self.assertEqual(second['opening_balance'], '1300.00')
+        self.assertEqual(second['expense'], '50.00')
+        self.assertEqual(second['closing_balance'], '1250.00')
+
+    def test_summary_seeds_from_earlier_snapshot(self):
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=self.monday, opening_balance=Decimal('100.00'))
+        self._tx('INCOME', '40.00', self.monday + datetime.timedelta(days=3))
+        self._tx('INCOME', '10.00', datetime.date(2025, 4, 2))
+
+        with self.assertNumQueries(2):
+            results = balance_summary(self.user, datetime.date(2025, 4, 1), datetime.date(2025, 4, 30), 'month')
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['opening_balance'], Decimal('140.00'))
+        self.assertEqual(results[0]['closing_balance'], Decimal('150.00'))
+
+    def test_summary_rejects_reversed_range(self):
+        response = self.client.get('/api/weeks/summary/', {'date_from': '2025-02-01', 'date_to': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class WeeklyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rollupuser',
+            email='rollup@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.monday = datetime.date(2025, 3, 3)
+
+    def _bucket(self, type='EXPENSE', method='CARD', week=None):
+        return WeeklyRollup.objects.get(
+            user=self.user, week_start_date=week or self.monday, type=type, method=method
+        )
+
+    # --- USE CASE 16: Rollups follow create, update and soft delete ---
+    def test_viewset_writes_update_rollups(self):
+        response = self.client.post('/api/transactions/', {
+            'type': 'EXPENSE', 'amount': '20.00', 'date': str(self.monday + datetime.timedelta(days=2)),
+            'counterparty': 'Shop', 'method': 'CARD',
+        })
+        tx_id = response.data['id']
+        self.assertEqual(self._bucket().total, Decimal('20.00'))
+        self.assertEqual(self._bucket().count, 1)
+
+        # Moving it to the next week moves the totals too
+        next_week = self.monday + datetime.timedelta(days=7)
+        self.client.patch(f'/api/transactions/{tx_id}/', {'date': str(next_week), 'amount': '25.00'})
+        self.assertEqual(self._bucket().count, 0)
+        self.assertEqual(self._bucket(week=next_week).total, Decimal('25.00'))
+
+        self.client.delete(f'/api/transactions/{tx_id}/')
+        self.assertEqual(self._bucket(week=next_week).total, Decimal('0.00'))
+        self.assertEqual(rollups.find_drift([self.user]), [])
+
+    def test_push_and_mark_paid_update_rollups(self):
+        self.client.post('/api/sync/push/', {'transactions': [
+            {'id': str(uuid.uuid4()), 'type': 'INCOME', 'amount': '100.00',
+             'date': str(self.monday), 'counterparty': 'Job', 'method': 'TRANSFER'},
+        ]}, format='json')
+        payment = ScheduledPayment.objects.create(
+            user=self.user, payee='Gym', amount=Decimal('30.00'),
+            due_date=self.monday, expected_method='CASH'
+        )
+        self.client.post(f'/api/payments/{payment.id}/mark-paid/')
+
+        self.assertEqual(self._bucket('INCOME', 'TRANSFER').total, Decimal('100.00'))
+        self.assertEqual(rollups.find_drift([self.user]), [])
+
+    # --- USE CASE 17: The rebuild command repairs drift ---
+    def test_rebuild_command_fixes_drift(self):
+        Transaction.objects.create(
+            user=self.user, type='EXPENSE', amount=Decimal('9.00'),
+            date=self.monday, counterparty='Direct', method='CASH'
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--verify', stdout=io.StringIO())
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        call_command('rebuild_rollups', '--verify', stdout=io.StringIO())
+        self.assertEqual(self._bucket(method='CASH').total, Decimal('9.00'))
+
+
+class SyncStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='streamuser',
+            email='stream@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        today = timezone.now().date()
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, type='EXPENSE', amount=Decimal('1.00'),
+                        date=today, counterparty=f'Shop {i}', method='CASH')
+            for i in range(7)
+        ])
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=today)
+
+    def _lines(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    # --- USE CASE 18: Streamed pull matches the buffered one ---
+    def test_stream_matches_buffered_pull(self):
+        since = '1970-01-01T00:00:00Z'
+        buffered = self.client.get('/api/sync/pull/', {'since': since}).json()
+        response = self.client.get('/api/sync/pull/', {'since': since, 'stream': '1'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self._lines(response)
+        self.assertEqual(lines[-1]['kind'], 'meta')
+        self.assertIn('cursor', lines[-1])
+        streamed = [line['data'] for line in lines if line['kind'] == 'transactions']
+        self.assertEqual(streamed, buffered['transactions'])
+        self.assertEqual(len([line for line in lines if line['kind'] == 'weeks']), 1)
+
+    def test_stream_negotiated_by_accept_header(self):
+        response = self.client.get(
+            '/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'},
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(self._lines(response)), 9)
+
+    def test_stream_chunks_are_bounded(self):
+        queryset = Transaction.objects.filter(user=self.user)
+        chunks = list(stream_pull([('transactions', queryset, TransactionSerializer)], 'c', chunk_size=3))
+        # 7 rows in chunks of 3, then the meta line
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [3, 3, 1, 1])
+
+
+class FastReadSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='fastuser',
+            email='fast@example.com',
+            password='password123'
+        )
+        today = timezone.now().date()
+        paid = ScheduledPayment.objects.create(
+            user=self.user, payee='Rent', amount=Decimal('850'), due_date=today,
+            status='PAID', paid_at=timezone.now(), notes='Ñandú €', expected_method='TRANSFER'
+        )
+        ScheduledPayment.objects.create(user=self.user, payee='Gym', amount=Decimal('30.5'), due_date=today)
+        Transaction.objects.create(
+            user=self.user, type='EXPENSE', amount=Decimal('850.00'), date=today,
+            counterparty='Rent', method='TRANSFER', linked_payment=paid
+        )
+        Transaction.objects.create(
+            user=self.user, type='INCOME', amount=Decimal('0.1'), date=today,
+            counterparty='Café', description='', method='OTHER', deleted_at=timezone.now()
+        )
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=today, opening_balance=Decimal('12.3'))
+
+    # --- USE CASE 19: Fast path renders the same bytes as the ModelSerializers ---
+    def test_fast_path_is_byte_identical(self):
+        renderer = JSONRenderer()
+        for model, serializer_class in (
+            (Transaction, TransactionSerializer),
+            (ScheduledPayment, ScheduledPaymentSerializer),
+            (WeeklyPeriod, WeeklyPeriodSerializer),
+        ):
+            queryset = model.objects.filter(user=self.user).order_by('id')
+            fast = fast_serializer(serializer_class)
+            expected = renderer.render(serializer_class(queryset, many=True).data)
+            actual = renderer.render(fast.serialize(fast.values(queryset)))
+            self.assertEqual(actual, expected, serializer_class.__name__)
+
+    def test_list_endpoint_uses_fast_path(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        rows = client.get('/api/transactions/').data['results']
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['type_display'], 'Expense')
+        self.assertEqual(rows[0]['method_display'], 'Transfer')
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='metricsuser',
+            email='metrics@example.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        metrics_registry.reset()
+
+    # --- USE CASE 21: Every request reports its queries and timings ---
+    def test_server_timing_header(self):
+        response = self.client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'})
+        header = response['Server-Timing']
+        self.assertIn('desc="4 queries"', header)
+        for metric in ('db;', 'render;', 'app;', 'total;'):
+            self.assertIn(metric, header)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'})
+        self.client.get('/api/transactions/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        report = self.client.get('/api/metrics/').data
+        self.assertEqual(report['GET sync-pull']['count'], 1)
+        self.assertEqual(report['GET sync-pull']['queries']['p50'], 4)
+        self.assertIn('p99', report['GET transaction-list']['total_ms'])
+
+
+class BenchmarkTests(TestCase):
+    # --- USE CASE 22: The benchmark drives every scenario and flags regressions ---
+    def test_run_benchmark_small_scale(self):
+        users = benchmark.seed(users=1, days=14)
+        scenarios = benchmark.run_benchmark(users, iterations=2)
+
+        self.assertEqual(list(scenarios), list(benchmark.SCENARIOS))
+        for name, result in scenarios.items():
+            self.assertEqual(result['requests'], 2)
+            self.assertTrue(all(code < 400 for code in result['statuses']), name)
+        self.assertEqual(scenarios['pull_full']['queries']['max'], 4)
+
+    def test_mark_paid_outlasts_the_seeded_payments(self):
+        users = benchmark.seed(users=1, days=7, payments=1)
+        scenarios = benchmark.run_benchmark(users, iterations=3)
+        self.assertEqual(scenarios['mark_paid']['statuses'], [200])
+
+    def test_compare_flags_latency_and_query_regressions(self):
+        def report(p50, queries):
+            return {'scenarios': {'pull_full': {'latency_ms': {'p50': p50}, 'queries': {'max': queries}}}}
+
+        self.assertEqual(benchmark.compare(report(11, 3), report(10, 3), threshold=0.2), [])
+        self.assertEqual(len(benchmark.compare(report(13, 3), report(10, 3), threshold=0.2)), 1)
+        self.assertEqual(len(benchmark.compare(report(10, 4), report(10, 3), threshold=0.2)), 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='etaguser', email='etag@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tx = Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('10.00'),
+                                             date=timezone.now().date(), counterparty='Shop', method='CASH')
+
+    def _pull(self, **headers):
+        return self.client.get('/api/sync/pull/', {'since': '1970-01-01T00:00:00Z'}, **headers)
+
+    # --- USE CASE 23: Idle polls get a 304 after one query ---
+    def test_list_not_modified(self):
+        etag = self.client.get('/api/transactions/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_pull_not_modified(self):
+        etag = self._pull()['ETag']
+        with self.assertNumQueries(1):
+            response = self._pull(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=datetime.date(2025, 3, 3))
+        last_modified = self.client.get('/api/weeks/')['Last-Modified']
+        response = self.client.get('/api/weeks/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    # --- USE CASE 24: Any write, query or caller change yields a new ETag ---
+    def test_writes_change_the_etag(self):
+        etag = self._pull()['ETag']
+        self.client.patch(f'/api/transactions/{self.tx.id}/', {'amount': '12.00'})
+        self.assertEqual(self._pull(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self._pull()['ETag']
+        self.client.delete(f'/api/transactions/{self.tx.id}/')
+        self.assertEqual(self._pull(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_query_and_user(self):
+        etag = self.client.get('/api/transactions/')['ETag']
+        response = self.client.get('/api/transactions/', {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/transactions/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='loguser', email='log@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_tx(self, counterparty='Shop'):
+        response = self.client.post('/api/transactions/', {
+            'type': 'EXPENSE', 'amount': '10.00', 'date': '2025-03-03',
+            'counterparty': counterparty, 'method': 'CASH',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def _log(self):
+        return list(ChangeLog.objects.filter(user=self.user).order_by('seq').values_list('seq', 'model', 'op'))
+
+    # --- USE CASE 25: Every write is logged with a gapless per-user sequence ---
+    def test_api_writes_are_logged(self):
+        tx_id = self._create_tx()
+        self.client.patch(f'/api/transactions/{tx_id}/', {'amount': '12.00'})
+        self.client.delete(f'/api/transactions/{tx_id}/')
+        self.assertEqual(self._log(), [
+            (1, 'transactions', 'create'), (2, 'transactions', 'update'), (3, 'transactions', 'delete'),
+        ])
+        self.assertEqual(SyncCounter.objects.get(user=self.user).seq, 3)
+
+    def test_push_and_mark_paid_are_logged(self):
+        payment_id = str(uuid.uuid4())
+        self.client.post('/api/sync/push/', {
+            'payments': [{'id': payment_id, 'payee': 'Rent', 'amount': '500.00', 'due_date': '2025-03-01'}],
+            'weeks': [{'week_start_date': '2025-03-03'}, {'week_start_date': '2025-03-10'}],
+        }, format='json')
+        self.client.post(f'/api/payments/{payment_id}/mark-paid/')
+        self.assertEqual([op for _, _, op in self._log()], ['create', 'create', 'create', 'create', 'update'])
+        self.assertEqual(sorted(model for _, model, _ in self._log()),
+                         ['payments', 'payments', 'transactions', 'weeks', 'weeks'])
+
+    def test_record_changes_spans_users(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        rows = [
+            Transaction(user=user, type='INCOME', amount=Decimal('1.00'), date=datetime.date(2025, 3, 3),
+                        counterparty='X', method='CASH')
+            for user in (self.user, other, self.user)
+        ]
+        Transaction.objects.bulk_create(rows)
+        changelog.record_changes((row, True) for row in rows)
+        self.assertEqual(changelog.current(self.user)[0], 2)
+        self.assertEqual(changelog.current(other)[0], 1)
+
+    # --- USE CASE 26: Pull by integer cursor ---
+    def test_pull_by_seq(self):
+        first_id = self._create_tx('First')
+        response = self.client.get('/api/sync/pull/', {'seq': 0})
+        self.assertEqual(response.data['seq'], 1)
+        self.assertEqual([row['id'] for row in response.data['transactions']], [first_id])
+
+        second_id = self._create_tx('Second')
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/sync/pull/', {'seq': 1})
+        self.assertEqual([row['id'] for row in response.data['transactions']], [second_id])
+        self.assertEqual(response.data['seq'], 2)
+
+        self.assertEqual(self.client.get('/api/sync/pull/', {'seq': 2}).data['transactions'], [])
+        self.assertEqual(self.client.get('/api/sync/pull/', {'seq': '-1'}).status_code, 400)
+
+    # --- USE CASE 27: Compaction keeps the latest entry per object ---
+    def test_compact_drops_superseded_entries(self):
+        tx_id = self._create_tx()
+        other_id = self._create_tx('Other')
+        self.client.patch(f'/api/transactions/{tx_id}/', {'amount': '12.00'})
+
+        out = io.StringIO()
+        call_command('compact_changelog', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(self._log(), [(2, 'transactions', 'create'), (3, 'transactions', 'update')])
+
+        ids = {row['id'] for row in self.client.get('/api/sync/pull/', {'seq': 0}).data['transactions']}
+        self.assertEqual(ids, {tx_id, other_id})
+
+    def test_rebuild_relogs_bulk_rows(self):
+        self._create_tx()
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, type='INCOME', amount=Decimal('1.00'), date=datetime.date(2025, 3, 3),
+                        counterparty='Bulk', method='CASH')
+        ])
+        changelog.rebuild([self.user])
+        self.assertEqual([seq for seq, _, _ in self._log()], [2, 3])
+        self.assertEqual(len(self.client.get('/api/sync/pull/', {'seq': 1}).data['transactions']), 2)
+
+
+class CompactPullTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='compactuser', email='compact@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        rng = __import__('random').Random(7)
+        start = datetime.date(2025, 1, 1)
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, type=rng.choice(['INCOME', 'EXPENSE']),
+                        amount=Decimal(rng.randint(100, 99999)) / 100,
+                        date=start + datetime.timedelta(days=i % 180),
+                        counterparty=rng.choice(['Market', 'Rent', 'Salary', 'Cafe']),
+                        method=rng.choice(['CASH', 'CARD', 'TRANSFER']))
+            for i in range(300)
+        ])
+        ScheduledPayment.objects.create(user=self.user, payee='Rent', amount=Decimal('500.00'),
+                                        due_date=datetime.date(2025, 3, 1))
+        self.params = {'since': '1970-01-01T00:00:00Z'}
+
+    # --- USE CASE 28: Compact pull carries the same data, columnar ---
+    def test_compact_pull_round_trips(self):
+        full = self.client.get('/api/sync/pull/', self.params).json()
+        compact = self.client.get('/api/sync/pull/', {**self.params, 'compact': '1'}).json()
+
+        for key in ('transactions', 'payments', 'weeks'):
+            labels = compact['labels'].get(key, {})
+            rebuilt = []
+            for values in compact[key]['rows']:
+                row = dict(zip(compact[key]['fields'], values))
+                for column, names in labels.items():
+                    row[f'{column}_display'] = names[row[column]]
+                rebuilt.append(row)
+            self.assertEqual(rebuilt, full[key])
+        self.assertEqual(compact['seq'], full['seq'])
+
+    # --- USE CASE 29: API responses are gzipped above the threshold ---
+    def test_large_api_responses_are_gzipped(self):
+        plain = self.client.get('/api/sync/pull/', self.params)
+        self.assertNotIn('Content-Encoding', plain)
+
+        response = self.client.get('/api/sync/pull/', {**self.params, 'compact': '1'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(body['transactions']['rows']), 300)
+        # Compact + gzip is roughly an order of magnitude smaller than the
+        # plain pull (random UUIDs and amounts bound the ratio here)
+        self.assertLess(len(response.content) * 8, len(plain.content))
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/weeks/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_streamed_pull_is_gzipped(self):
+        response = self.client.get('/api/sync/pull/', {**self.params, 'stream': '1'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(json.loads(lines[-1])['kind'], 'meta')
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN every SELECT issued by the hot endpoints and fail on a full scan
+    of a finance table, so a query change cannot silently drop its index.
+    Works on SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN, with
+    sequential scans disabled so tiny test tables still show the index).
+    """
+    FULL_SCAN = r'(SCAN (TABLE )?|Seq Scan on )"?finance_'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planuser', email='plan@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        payment = ScheduledPayment.objects.create(user=self.user, payee='Rent', amount=Decimal('500.00'),
+                                                  due_date=datetime.date(2025, 3, 1))
+        Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('500.00'),
+                                   date=datetime.date(2025, 3, 1), counterparty='Rent', method='CARD',
+                                   linked_payment=payment)
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=datetime.date(2025, 2, 24))
+
+    def _plans(self, *requests):
+        with CaptureQueriesContext(connection) as ctx:
+            for path, params in requests:
+                self.assertEqual(self.client.get(path, params).status_code, 200, path)
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        plans = []
+        with connection.cursor() as cursor:
+            postgres = connection.vendor == 'postgresql'
+            if postgres:
+                cursor.execute('SET enable_seqscan = off')
+            for sql in selects:
+                cursor.execute(('EXPLAIN ' if postgres else 'EXPLAIN QUERY PLAN ') + sql)
+                plans.append((sql, '\n'.join(str(row[-1]) for row in cursor.fetchall())))
+            if postgres:
+                cursor.execute('RESET enable_seqscan')
+        return plans
+
+    def assertIndexed(self, *requests):
+        plans = self._plans(*requests)
+        self.assertTrue(plans)
+        for sql, plan in plans:
+            self.assertNotRegex(plan, self.FULL_SCAN, f'{sql}\n{plan}')
+        return '\n'.join(plan for _, plan in plans)
+
+    # --- USE CASE 30: Hot queries stay on their indexes ---
+    def test_list_endpoints_use_indexes(self):
+        plans = self.assertIndexed(
+            ('/api/transactions/', {}),
+            ('/api/payments/', {}),
+            ('/api/weeks/', {}),
+        )
+        self.assertIn('tx_user_active_date_idx', plans)
+        self.assertIn('payment_user_active_due_idx', plans)
+
+    def test_sync_pull_uses_indexes(self):
+        plans = self.assertIndexed(('/api/sync/pull/', {'since': '2025-01-01T00:00:00Z'}))
+        self.assertIn('tx_user_updated_idx', plans)
+        self.assertIndexed(('/api/sync/pull/', {'seq': 1}))
+
+    def test_filtered_transaction_list_uses_indexes(self):
+        plans = self.assertIndexed(('/api/transactions/', {
+            'date_from': '2025-01-01', 'date_to': '2025-03-31', 'type': 'EXPENSE', 'search': 'ren',
+        }))
+        self.assertIn('tx_user_active_date_idx', plans)
+
+    def test_running_balance_uses_indexes(self):
+        self.assertIndexed(('/api/transactions/', {'with_balance': 1}))
+
+    def test_upcoming_payments_use_pending_index(self):
+        cache.clear()
+        plans = self.assertIndexed(('/api/payments/upcoming/', {'days': 30}))
+        # SQLite may prefer the (user, due_date, id) index, which also
+        # gives the order; PostgreSQL takes the smaller partial one
+        self.assertRegex(plans, 'payment_user_(pending|active_due)_idx')
+
+    def test_summary_uses_indexes(self):
+        self.assertIndexed(
+            ('/api/weeks/summary/', {'date_from': '2025-02-24', 'date_to': '2025-03-09'}),
+            ('/api/weeks/summary/', {'date_from': '2025-02-01', 'date_to': '2025-03-31', 'period': 'month'}),
+        )
+
+    def test_pending_payments_use_partial_index(self):
+        queryset = ScheduledPayment.objects.filter(
+            user=self.user, status='PENDING', deleted_at__isnull=True, due_date__gte=datetime.date(2025, 1, 1)
+        ).order_by('due_date')
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+            plan = queryset.explain()
+            if connection.vendor == 'postgresql':
+                cursor.execute('RESET enable_seqscan')
+        self.assertIn('payment_user_pending_idx', plan)
+
+
+class TransactionFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='filteruser', email='filter@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        payment = ScheduledPayment.objects.create(user=self.user, payee='Landlord', amount=Decimal('800.00'),
+                                                  due_date=datetime.date(2025, 3, 1))
+        rows = [
+            ('INCOME', '2500.00', datetime.date(2025, 3, 1), 'ACME Corp', 'Salary', 'TRANSFER', None),
+            ('EXPENSE', '800.00', datetime.date(2025, 3, 2), 'Landlord', 'March rent', 'TRANSFER', payment),
+            ('EXPENSE', '12.50', datetime.date(2025, 3, 5), 'Corner Cafe', 'Breakfast', 'CARD', None),
+            ('EXPENSE', '60.00', datetime.date(2025, 4, 1), 'Supermarket', 'Weekly groceries', 'CASH', None),
+        ]
+        self.ids = {}
+        for type, amount, date, counterparty, description, method, linked in rows:
+            tx = Transaction.objects.create(user=self.user, type=type, amount=Decimal(amount), date=date,
+                                            counterparty=counterparty, description=description,
+                                            method=method, linked_payment=linked)
+            self.ids[tx.id] = counterparty
+        Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('5.00'),
+                                   date=datetime.date(2025, 3, 3), counterparty='Corner Cafe', method='CARD',
+                                   deleted_at=timezone.now())
+
+    def _list(self, **params):
+        response = self.client.get('/api/transactions/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(row['counterparty'] for row in response.data['results'])
+
+    # --- USE CASE 31: The transaction list filters in the database ---
+    def test_date_type_and_method_filters(self):
+        self.assertEqual(self._list(date_from='2025-03-01', date_to='2025-03-31'),
+                         ['ACME Corp', 'Corner Cafe', 'Landlord'])
+        self.assertEqual(self._list(type='INCOME'), ['ACME Corp'])
+        self.assertEqual(self._list(method='CARD'), ['Corner Cafe'])
+
+    def test_amount_and_linked_payment_filters(self):
+        self.assertEqual(self._list(min_amount='50', max_amount='800'), ['Landlord', 'Supermarket'])
+        self.assertEqual(self._list(linked_payment='true'), ['Landlord'])
+        self.assertEqual(self._list(linked_payment='false'), ['ACME Corp', 'Corner Cafe', 'Supermarket'])
+
+    def test_search_matches_counterparty_or_description(self):
+        self.assertEqual(self._list(search='cafe'), ['Corner Cafe'])
+        self.assertEqual(self._list(search='GROCER'), ['Supermarket'])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'type': 'GIFT'}, {'date_from': '2025-04-01', 'date_to': '2025-03-01'},
+                       {'min_amount': '10', 'max_amount': '1'}, {'min_amount': 'abc'}):
+            self.assertEqual(self.client.get('/api/transactions/', params).status_code, 400, params)
+
+    def test_filters_do_not_affect_detail_routes(self):
+        tx_id = next(iter(self.ids))
+        response = self.client.get(f'/api/transactions/{tx_id}/', {'type': 'GIFT'})
+        self.assertEqual(response.status_code, 200)
+
+
+class MarkPaidTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='payuser', email='pay@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payments = [
+            ScheduledPayment.objects.create(user=self.user, payee=f'Bill {i}', amount=Decimal('25.00'),
+                                            due_date=datetime.date(2025, 3, 1 + i), expected_method='CARD')
+            for i in range(3)
+        ]
+
+    def _mark(self, payment, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(f'/api/payments/{payment.id}/mark-paid/', **headers)
+
+    # --- USE CASE 32: Retried mark-paid requests replay the first result ---
+    def test_idempotency_key_replays_result(self):
+        first = self._mark(self.payments[0], key='tap-1')
+        second = self._mark(self.payments[0], key='tap-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(Transaction.objects.filter(linked_payment=self.payments[0]).count(), 1)
+
+        # Without the key a repeat is rejected instead of paying twice
+        self.assertEqual(self._mark(self.payments[0]).status_code, 400)
+
+    def test_idempotency_key_reuse_for_other_request(self):
+        self._mark(self.payments[0], key='tap-1')
+        self.assertEqual(self._mark(self.payments[1], key='tap-1').status_code, 422)
+        self.assertEqual(ScheduledPayment.objects.get(id=self.payments[1].id).status, 'PENDING')
+
+    def test_idempotency_key_in_progress(self):
+        # Simulate a first attempt still running under the same key
+        digest = hashlib.sha256(b'tap-2').hexdigest()
+        cache.add(f'finance:idempotency:{self.user.pk}:{digest}:lock', True, 30)
+        self.assertEqual(self._mark(self.payments[0], key='tap-2').status_code, 409)
+
+    def test_idempotency_result_stored_while_waiting_for_lock(self):
+        first = self._mark(self.payments[0], key='tap-3')
+        cache_key = f"finance:idempotency:{self.user.pk}:{hashlib.sha256(b'tap-3').hexdigest()}"
+        stored = cache.get(cache_key)
+        # The retry reads nothing, then the first attempt stores its result
+        with mock.patch('apps.finance.idempotency.cache.get', side_effect=[None, stored]):
+            retry = self._mark(self.payments[0], key='tap-3')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (200, 'true'))
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(cache.get(cache_key)['status'], 200)
+
+    def test_existing_linked_transaction_is_a_conflict(self):
+        Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('25.00'),
+                                   date=datetime.date(2025, 3, 1), counterparty='Bill 0', method='CARD',
+                                   linked_payment=self.payments[0])
+        self.assertEqual(self._mark(self.payments[0]).status_code, 409)
+        self.assertEqual(ScheduledPayment.objects.get(id=self.payments[0].id).status, 'PENDING')
+
+    # --- USE CASE 33: Many payments are paid in one request ---
+    def test_batch_mark_paid(self):
+        self._mark(self.payments[2])
+        missing = uuid.uuid4()
+        response = self.client.post('/api/payments/mark-paid/', {
+            'ids': [str(p.id) for p in self.payments] + [str(missing)],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['paid', 'paid', 'error', 'error'])
+
+        self.assertEqual(ScheduledPayment.objects.filter(user=self.user, status='PAID').count(), 3)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(rollups.find_drift([self.user]), [])
+        paid_id = response.data['results'][0]['transaction']
+        ids = {row['id'] for row in self.client.get('/api/sync/pull/', {'seq': 0}).data['transactions']}
+        self.assertIn(paid_id, ids)
+
+    def test_batch_query_count_is_fixed(self):
+        extra = [
+            ScheduledPayment.objects.create(user=self.user, payee=f'Extra {i}', amount=Decimal('5.00'),
+                                            due_date=datetime.date(2025, 4, 1), expected_method='CARD')
+            for i in range(20)
+        ]
+        # Warm-up: creates the rollup bucket and the sync counter
+        self.client.post('/api/payments/mark-paid/', {'ids': [str(self.payments[0].id)]}, format='json')
+
+        def count(payments):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/payments/mark-paid/', {'ids': [str(p.id) for p in payments]},
+                                            format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(self.payments[1:3]), count(extra))
+
+    def test_batch_link_taken_after_check_is_a_conflict(self):
+        # A push links the payment between the check and the insert
+        taken = Transaction(user=self.user, type='EXPENSE', amount=Decimal('25.00'), date=datetime.date(2025, 3, 1),
+                            counterparty='Bill 0', method='CARD', linked_payment=self.payments[0])
+        with mock.patch('apps.finance.views.Transaction.objects.filter') as linked:
+            linked.return_value.values_list.return_value = []
+            taken.save()
+            response = self.client.post('/api/payments/mark-paid/', {'ids': [str(p.id) for p in self.payments]},
+                                        format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(ScheduledPayment.objects.filter(user=self.user, status='PAID').exists())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_batch_validates_ids(self):
+        for payload in ({}, {'ids': []}, {'ids': ['nope']}):
+            self.assertEqual(self.client.post('/api/payments/mark-paid/', payload, format='json').status_code, 400)
+
+
+class BulkTransactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkuser', email='bulk@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _row(self, i, **kwargs):
+        row = {'type': 'EXPENSE', 'amount': f'{i + 1}.00', 'date': '2025-03-03',
+               'counterparty': f'Shop {i}', 'method': 'CARD'}
+        row.update(kwargs)
+        return row
+
+    def _bulk(self, method, items, **params):
+        url = '/api/transactions/bulk/'
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return getattr(self.client, method)(url, items, format='json')
+
+    # --- USE CASE 34: Bulk create and update in one request ---
+    def test_bulk_create_and_patch(self):
+        response = self._bulk('post', [self._row(i) for i in range(50)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({r['status'] for r in response.data['results']}, {'created'})
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 50)
+
+        ids = [r['id'] for r in response.data['results'][:2]]
+        response = self._bulk('patch', [{'id': ids[0], 'amount': '99.00'}, {'id': ids[1], 'deleted_at': '2025-03-04T00:00:00Z'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Transaction.objects.get(id=ids[0]).amount, Decimal('99.00'))
+        self.assertEqual(Transaction.objects.get(id=ids[0]).counterparty, 'Shop 0')
+        self.assertIsNotNone(Transaction.objects.get(id=ids[1]).deleted_at)
+
+        self.assertEqual(rollups.find_drift([self.user]), [])
+        self.assertEqual(changelog.current(self.user)[0], 52)
+
+    def test_invalid_item_rejects_the_batch(self):
+        response = self._bulk('post', [self._row(0), self._row(1, amount='lots')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['skipped', 'error'])
+        self.assertIn('amount', response.data['results'][1]['errors'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_allow_partial_writes_valid_items(self):
+        response = self._bulk('post', [self._row(0), self._row(1, type='GIFT')], allow_partial=1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error'])
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_ids_must_be_new_on_post_and_known_on_patch(self):
+        tx_id = self._bulk('post', [self._row(0)]).data['results'][0]['id']
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        foreign = Transaction.objects.create(user=other, type='INCOME', amount=Decimal('1.00'),
+                                             date=datetime.date(2025, 3, 3), counterparty='X', method='CASH')
+
+        results = self._bulk('post', [self._row(1, id=tx_id)], allow_partial=1).data['results']
+        self.assertEqual(results[0]['errors'], {'id': ['Already exists.']})
+        results = self._bulk('patch', [{'amount': '2.00'}, {'id': str(foreign.id), 'amount': '2.00'}],
+                             allow_partial=1).data['results']
+        self.assertEqual([r['errors'] for r in results], [{'id': ['This field is required.']}, {'id': ['Not found.']}])
+        self.assertEqual(Transaction.objects.get(id=foreign.id).amount, Decimal('1.00'))
+
+    def test_query_count_does_not_grow_with_batch(self):
+        self._bulk('post', [self._row(0)])
+
+        def count(n):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._bulk('post', [self._row(i) for i in range(n)]).status_code, 201)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(5), count(40))
+
+    def test_rejects_non_list_payload(self):
+        self.assertEqual(self._bulk('post', {'type': 'EXPENSE'}).status_code, 400)
+
+
+OFX_STATEMENT = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250303120000<TRNAMT>-4.50<FITID>A1<NAME>Corner Cafe<MEMO>Latte</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250303<TRNAMT>-4.50<FITID>A2<NAME>Corner Cafe</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250305<TRNAMT>2500.00<FITID>A3<NAME>ACME Corp<MEMO>Salary</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>garbage<TRNAMT>-1.00<FITID>A4<NAME>Broken</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class StatementImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='importuser', email='import@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _csv_file(self, content):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/api/transactions/import/', {'file': upload, **data}, format='multipart')
+
+    # --- USE CASE 35: CSV statements import once, with a column mapping ---
+    def test_command_imports_csv_and_skips_reimports(self):
+        path = self._csv_file(
+            'Fecha;Importe;Concepto\n'
+            '03/03/2025;-4,50;Corner Cafe\n'
+            '03/03/2025;-4,50;Corner Cafe\n'
+            '05/03/2025;1.250,00;ACME Corp\n'
+            'not-a-date;1,00;Broken\n'
+        )
+        args = [path, '--user', 'import@example.com', '--delimiter', ';', '--date-format', '%d/%m/%Y',
+                '--decimal-comma', '--map', 'date=Fecha', '--map', 'amount=Importe', '--map', 'counterparty=Concepto',
+                '--method', 'CARD', '--batch-size', '2']
+        out = io.StringIO()
+        call_command('import_statement', *args, stdout=out, stderr=io.StringIO())
+        self.assertIn('3 created', out.getvalue())
+        self.assertIn('1 invalid', out.getvalue())
+
+        rows = Transaction.objects.filter(user=self.user).order_by('date', 'counterparty')
+        # Two identical coffees on the same day are both kept
+        self.assertEqual([(tx.type, tx.amount, tx.method) for tx in rows], [
+            ('EXPENSE', Decimal('4.50'), 'CARD'), ('EXPENSE', Decimal('4.50'), 'CARD'),
+            ('INCOME', Decimal('1250.00'), 'CARD'),
+        ])
+        self.assertEqual(rollups.find_drift([self.user]), [])
+        self.assertEqual(changelog.current(self.user)[0], 3)
+
+        out = io.StringIO()
+        call_command('import_statement', *args, stdout=out, stderr=io.StringIO())
+        self.assertIn('0 created, 3 already imported', out.getvalue())
+
+    def test_command_rejects_missing_columns(self):
+        path = self._csv_file('when,how much\n2025-03-03,1.00\n')
+        with self.assertRaises(CommandError):
+            call_command('import_statement', path, '--user', 'import@example.com')
+
+    # --- USE CASE 36: OFX uploads through the API ---
+    def test_ofx_upload_dedupes_on_fitid(self):
+        response = self._upload('march.ofx', OFX_STATEMENT)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['errors']), (3, 1))
+        self.assertEqual(Transaction.objects.get(description='Salary').type, 'INCOME')
+
+        response = self._upload('march.ofx', OFX_STATEMENT)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (0, 3))
+
+    def test_ofx_reader_handles_single_line_files_in_small_chunks(self):
+        single_line = OFX_STATEMENT.replace('\n', '')
+        with mock.patch.object(importer, 'OFX_CHUNK_SIZE', 16):
+            records = list(importer.read_ofx(io.StringIO(single_line)))
+        self.assertEqual([r['reference'] for r in records if isinstance(r, dict)], ['A1', 'A2', 'A3'])
+        self.assertEqual(records[0]['counterparty'], 'Corner Cafe')
+        self.assertEqual(records[0]['description'], 'Latte')
+
+    def test_csv_upload_with_mapping_and_errors(self):
+        content = 'day,value,who,kind\n2025-03-03,12.00,Market,expense\n2025-03-04,3.00,Refund,income\n'
+        response = self._upload('march.csv', content,
+                                mapping=json.dumps({'date': 'day', 'amount': 'value', 'counterparty': 'who',
+                                                    'type': 'kind'}))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sorted(Transaction.objects.values_list('counterparty', 'type')),
+                         [('Market', 'EXPENSE'), ('Refund', 'INCOME')])
+
+        self.assertEqual(self._upload('march.csv', content).status_code, 400)
+        self.assertEqual(self._upload('march.csv', content, mapping='{"when": "day"}').status_code, 400)
+
+    def test_refund_of_an_expense_on_the_same_day_is_kept(self):
+        content = 'date,amount,counterparty\n2025-03-03,-25.00,Shoe Shop\n2025-03-03,25.00,Shoe Shop\n'
+        response = self._upload('march.csv', content)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (2, 0))
+        self.assertEqual(sorted(Transaction.objects.values_list('type', flat=True)), ['EXPENSE', 'INCOME'])
+        self.assertEqual(self._upload('march.csv', content).data['duplicates'], 2)
+
+    def test_truncated_row_is_a_row_error(self):
+        content = 'date,amount,counterparty\n2025-03-03,-4.50,Cafe\n2025-03-04\n'
+        response = self._upload('march.csv', content)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['errors']), (1, 1))
+        self.assertIn('Line 3', response.data['error_details'][0])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exportuser', email='export@example.com', password='x')
+        other = User.objects.create_user(username='otherexport', email='otherexport@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        day = datetime.date(2025, 3, 3)
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, type='EXPENSE', amount=Decimal(f'{i}.50'), date=day,
+                        counterparty=f'Shop, "{i}"', method='CARD')
+            for i in range(5)
+        ] + [Transaction(user=other, type='INCOME', amount=1, date=day, counterparty='Not mine', method='CASH')])
+        Transaction.objects.filter(user=self.user, amount=Decimal('4.50')).update(deleted_at=timezone.now())
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=day, opening_balance=Decimal('100.00'))
+
+    def _get(self, **params):
+        response = self.client.get('/api/export/', params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+    # --- USE CASE 37: Streamed exports in CSV, NDJSON and columnar form ---
+    def test_csv_export(self):
+        response, body = self._get(output='csv', section='transactions')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment; filename="transactions-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 4)
+        self.assertIn('Shop, "0"', {row['counterparty'] for row in rows})
+        self.assertEqual(sorted(row['amount'] for row in rows), ['0.50', '1.50', '2.50', '3.50'])
+        self.assertEqual({row['deleted_at'] for row in rows}, {''})
+        self.assertNotIn('user', rows[0])
+
+    def test_ndjson_and_columnar_cover_all_sections(self):
+        response, body = self._get(output='ndjson', include_deleted=1)
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([line['section'] for line in lines], ['transactions'] * 5 + ['weeks'])
+        self.assertEqual(lines[-1]['data']['opening_balance'], '100.00')
+
+        with mock.patch.object(export, 'COLUMNAR_ROW_GROUP', 3):
+            response, body = self._get(output='columnar')
+        groups = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(g['section'], len(g['columns'][0])) for g in groups],
+                         [('transactions', 3), ('transactions', 1), ('weeks', 1)])
+        amounts = groups[0]['columns'][groups[0]['fields'].index('amount')] + groups[1]['columns'][groups[1]['fields'].index('amount')]
+        self.assertEqual(sorted(amounts), ['0.50', '1.50', '2.50', '3.50'])
+
+    def test_export_never_builds_model_instances(self):
+        with mock.patch.object(Transaction, 'from_db', side_effect=AssertionError('model instance built')), \
+                mock.patch.object(WeeklyPeriod, 'from_db', side_effect=AssertionError('model instance built')):
+            response, body = self._get(output='ndjson')
+        self.assertEqual(len(body.splitlines()), 5)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self._get(output='xlsx')[0].status_code, 400)
+        self.assertEqual(self._get(output='csv', section=['transactions', 'weeks'])[0].status_code, 400)
+        self.assertEqual(self._get(section='accounts')[0].status_code, 400)
+
+    def test_command_writes_a_file(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_finance', '--user', 'export@example.com', '--output', 'csv', '--section', 'weeks',
+                     '--path', path, stderr=io.StringIO())
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['opening_balance'] for row in rows], ['100.00'])
+
+        out = io.StringIO()
+        call_command('export_finance', '--user', 'export@example.com', '--section', 'weeks', stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(line['section'], line['data']['opening_balance']) for line in lines], [('weeks', '100.00')])
+
+        with self.assertRaises(CommandError):
+            call_command('export_finance', '--user', 'nobody@example.com')
+
+
+class RecurringPaymentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='recuser', email='rec@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _template(self, user=None, **rule):
+        fields = {'payee': 'Rent', 'amount': Decimal('900.00'), 'start_date': datetime.date(2025, 1, 31), **rule}
+        template = RecurringPayment(user=user or self.user, **fields)
+        template.next_due_date = recurrence.first_due_date(template)
+        template.save()
+        return template
+
+    def _dates(self, template, on_or_after, count):
+        dates = recurrence.occurrences(template, on_or_after)
+        return [next(dates) for _ in range(count)]
+
+    # --- USE CASE 38: Recurrence rules ---
+    def test_monthly_weekly_and_nth_weekday_rules(self):
+        monthly = RecurringPayment(frequency='MONTHLY', interval=1, start_date=datetime.date(2025, 1, 31))
+        self.assertEqual(self._dates(monthly, monthly.start_date, 3),
+                         [datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31)])
+
+        quarterly = RecurringPayment(frequency='MONTHLY', interval=3, day_of_month=15, start_date=datetime.date(2025, 1, 20))
+        self.assertEqual(self._dates(quarterly, datetime.date(2025, 3, 1), 2),
+                         [datetime.date(2025, 4, 15), datetime.date(2025, 7, 15)])
+
+        fortnightly = RecurringPayment(frequency='WEEKLY', interval=2, start_date=datetime.date(2025, 3, 3),
+                                       end_date=datetime.date(2025, 3, 31))
+        self.assertEqual(list(recurrence.occurrences(fortnightly, datetime.date(2025, 3, 4))),
+                         [datetime.date(2025, 3, 17), datetime.date(2025, 3, 31)])
+
+        # Second Tuesday, and last Friday, of each month
+        second_tuesday = RecurringPayment(frequency='NTH_WEEKDAY', interval=1, weekday=1, week_of_month=2,
+                                          start_date=datetime.date(2025, 3, 1))
+        self.assertEqual(self._dates(second_tuesday, second_tuesday.start_date, 2),
+                         [datetime.date(2025, 3, 11), datetime.date(2025, 4, 8)])
+        last_friday = RecurringPayment(frequency='NTH_WEEKDAY', interval=1, weekday=4, week_of_month=-1,
+                                       start_date=datetime.date(2025, 3, 1), end_date=datetime.date(2025, 4, 30))
+        self.assertEqual(list(recurrence.occurrences(last_friday, last_friday.start_date)),
+                         [datetime.date(2025, 3, 28), datetime.date(2025, 4, 25)])
+
+    # --- USE CASE 39: Batched, idempotent materialisation ---
+    def test_materialise_in_batches_and_rerun(self):
+        users = [self.user] + [
+            User.objects.create_user(username=f'rec{i}', email=f'rec{i}@example.com', password='x') for i in range(4)
+        ]
+        templates = [self._template(user) for user in users]
+        ended = self._template(end_date=datetime.date(2025, 2, 28))
+        until = datetime.date(2025, 3, 31)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = recurrence.materialise(until, batch_size=2)
+        self.assertEqual(result, {'templates': 6, 'created': 17})
+        # Three batches of two templates plus the final empty select; a
+        # batch costs the same whatever the number of users in it
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 3 * 11)
+
+        self.assertEqual(
+            list(ScheduledPayment.objects.filter(recurring=templates[0]).order_by('due_date').values_list('due_date', flat=True)),
+            [datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31)],
+        )
+        templates[0].refresh_from_db()
+        ended.refresh_from_db()
+        self.assertEqual(templates[0].next_due_date, datetime.date(2025, 4, 30))
+        self.assertIsNone(ended.next_due_date)
+        # Each user's sequence stays gapless
+        self.assertEqual(changelog.current(users[1])[0], ChangeLog.objects.filter(user=users[1]).count())
+
+        self.assertEqual(recurrence.materialise(until)['created'], 0)
+        # An overlapping run that re-reads a stale cursor creates nothing twice
+        RecurringPayment.objects.filter(pk=templates[0].pk).update(next_due_date=datetime.date(2025, 1, 31))
+        self.assertEqual(recurrence.materialise(until), {'templates': 1, 'created': 0})
+        self.assertEqual(ScheduledPayment.objects.count(), 17)
+
+    def test_api_creates_template_and_upcoming_occurrences(self):
+        today = timezone.localdate()
+        response = self.client.post('/api/recurring-payments/', {
+            'payee': 'Gym', 'amount': '30.00', 'frequency': 'WEEKLY', 'start_date': (today - datetime.timedelta(days=70)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        template = RecurringPayment.objects.get(id=response.data['id'])
+        occurrences = ScheduledPayment.objects.filter(recurring=template)
+        # Starts from today, without backfilling the past weeks
+        self.assertTrue(occurrences.exists())
+        self.assertGreaterEqual(min(occurrences.values_list('due_date', flat=True)), today)
+        self.assertGreater(template.next_due_date, today + datetime.timedelta(days=recurrence.MATERIALISE_DAYS_AHEAD))
+
+        response = self.client.post('/api/recurring-payments/', {
+            'payee': 'Club', 'amount': '10.00', 'frequency': 'NTH_WEEKDAY', 'start_date': today.isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('weekday', response.data)
+
+    def test_edits_and_delete_follow_pending_occurrences(self):
+        today = timezone.localdate()
+        response = self.client.post('/api/recurring-payments/', {
+            'payee': 'Gym', 'amount': '30.00', 'frequency': 'WEEKLY', 'start_date': today.isoformat(),
+        })
+        url = f"/api/recurring-payments/{response.data['id']}/"
+        live = ScheduledPayment.objects.filter(recurring_id=response.data['id'], deleted_at__isnull=True)
+        count = live.count()
+        self.assertGreater(count, 0)
+        # A paid occurrence is history and stays as it is
+        paid = live.order_by('due_date').first()
+        ScheduledPayment.objects.filter(pk=paid.pk).update(status='PAID')
+
+        # Rule change: the old rule's pending occurrences are replaced
+        self.assertEqual(self.client.patch(url, {'start_date': (today + datetime.timedelta(days=1)).isoformat()}).status_code, 200)
+        pending = live.filter(status='PENDING')
+        # Same number of weekly dates in the horizon, not old plus new ones
+        self.assertEqual(pending.count(), count)
+        self.assertTrue(all(day.weekday() == (today.weekday() + 1) % 7 for day in pending.values_list('due_date', flat=True)))
+        self.assertEqual(live.filter(status='PAID').count(), 1)
+
+        # Plain edits are copied to the pending occurrences, and logged
+        seq = changelog.current(self.user)[0]
+        self.client.patch(url, {'amount': '35.00', 'payee': 'Gym+'})
+        self.assertEqual(set(pending.values_list('payee', 'amount')), {('Gym+', Decimal('35.00'))})
+        self.assertEqual(ScheduledPayment.objects.get(pk=paid.pk).amount, Decimal('30.00'))
+        self.assertEqual(changelog.current(self.user)[0], seq + pending.count() + 1)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(pending.exists())
+        self.assertEqual(live.count(), 1)
+
+    def test_command(self):
+        self._template(start_date=timezone.localdate())
+        out = io.StringIO()
+        call_command('materialise_payments', '--days-ahead', '0', stdout=out)
+        self.assertIn('Created 1 payments from 1 templates', out.getvalue())
+
+
+class UpcomingPaymentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='upuser', email='up@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        week_start = self.today - datetime.timedelta(days=self.today.weekday())
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=week_start, opening_balance=Decimal('1000.00'))
+        Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('100.00'), date=week_start,
+                                   counterparty='Market', method='CARD')
+        # Before the snapshot: already part of its opening balance
+        Transaction.objects.create(user=self.user, type='INCOME', amount=Decimal('500.00'),
+                                   date=week_start - datetime.timedelta(days=3), counterparty='ACME', method='TRANSFER')
+        # Rows were written straight through the ORM, bypassing the rollups
+        rollups.rebuild([self.user])
+        self.overdue = self._payment('Phone', '30.00', -2)
+        self.soon = self._payment('Rent', '600.00', 3)
+        self._payment('Insurance', '200.00', 20)
+        self._payment('Paid already', '10.00', 1, status='PAID')
+        self._payment('Deleted', '10.00', 1, deleted_at=timezone.now())
+
+    def _payment(self, payee, amount, days, **fields):
+        return ScheduledPayment.objects.create(user=self.user, payee=payee, amount=Decimal(amount),
+                                               due_date=self.today + datetime.timedelta(days=days), **fields)
+
+    # --- USE CASE 40: Upcoming and overdue payments, cached per user ---
+    def test_window_overdue_and_projection(self):
+        response = self.client.get('/api/payments/upcoming/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['payee'] for p in response.data['overdue']], ['Phone'])
+        self.assertEqual([p['payee'] for p in response.data['upcoming']], ['Rent'])
+        self.assertEqual(response.data['overdue_total'], '30.00')
+        self.assertEqual(response.data['upcoming_total'], '600.00')
+        self.assertEqual(response.data['current_balance'], '900.00')
+        self.assertEqual(response.data['projected_balance'], '270.00')
+
+        response = self.client.get('/api/payments/upcoming/', {'days': 30})
+        self.assertEqual([p['payee'] for p in response.data['upcoming']], ['Rent', 'Insurance'])
+        self.assertEqual(self.client.get('/api/payments/upcoming/', {'days': 1000}).status_code, 400)
+
+    def test_read_racing_a_write_is_not_cached(self):
+        load = views.ScheduledPaymentViewSet._upcoming
+
+        def racing(viewset, user, today, days):
+            data = load(viewset, user, today, days)
+            # A write commits after this read loaded its data, before it is stored
+            ScheduledPayment.objects.filter(id=self.soon.id).update(status='PAID')
+            invalidate_upcoming([user.pk])
+            return data
+
+        with mock.patch.object(views.ScheduledPaymentViewSet, '_upcoming', racing):
+            self.assertEqual(len(self.client.get('/api/payments/upcoming/').data['upcoming']), 1)
+        self.assertEqual(self.client.get('/api/payments/upcoming/').data['upcoming'], [])
+
+    def test_cache_hit_and_invalidation(self):
+        self.client.get('/api/payments/upcoming/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/payments/upcoming/')
+
+        # mark-paid, a payment created elsewhere and a new transaction all
+        # invalidate, once their transaction commits
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(f'/api/payments/{self.soon.id}/mark-paid/')
+            # Not yet cleared: a read now still sees the cached state
+            self.assertEqual(len(self.client.get('/api/payments/upcoming/').data['upcoming']), 1)
+        self.assertTrue(callbacks)
+        response = self.client.get('/api/payments/upcoming/')
+        self.assertEqual(response.data['upcoming'], [])
+        self.assertEqual(response.data['current_balance'], '300.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._payment('Gym', '25.00', 0)
+        self.assertEqual([p['payee'] for p in self.client.get('/api/payments/upcoming/').data['upcoming']], ['Gym'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/sync/push/', {'transactions': [{
+                'id': str(uuid.uuid4()), 'type': 'INCOME', 'amount': '50.00', 'date': self.today.isoformat(),
+                'counterparty': 'Refund', 'method': 'CARD',
+            }]}, format='json')
+        self.assertEqual(self.client.get('/api/payments/upcoming/').data['current_balance'], '350.00')
+
+
+class RunningBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='baluser', email='bal@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        monday = datetime.date(2025, 3, 3)
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=monday, opening_balance=Decimal('1000.00'))
+        # Re-anchors the chain: the snapshot wins over the computed balance
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=monday + datetime.timedelta(days=14),
+                                    opening_balance=Decimal('2000.00'))
+        rows = [
+            (-1, 'INCOME', '999.00'),  # before the first snapshot
+            (0, 'EXPENSE', '100.00'), (0, 'INCOME', '50.00'), (2, 'EXPENSE', '25.00'),
+            (8, 'EXPENSE', '75.00'), (14, 'EXPENSE', '10.00'), (16, 'INCOME', '5.00'),
+        ]
+        for days, type, amount in rows:
+            Transaction.objects.create(user=self.user, type=type, amount=Decimal(amount), counterparty='X',
+                                       method='CARD', date=monday + datetime.timedelta(days=days))
+        # Rows were written straight through the ORM, bypassing the rollups
+        rollups.rebuild([self.user])
+
+    def _ledger(self, **params):
+        items, url = [], '/api/transactions/'
+        params = {'with_balance': 1, 'page_size': 2, **params}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            items.extend(response.data['results'])
+            url, params = response.data['next'], None
+        return items
+
+    # --- USE CASE 41: Running balance on the paginated ledger ---
+    def test_running_balance_across_pages(self):
+        items = self._ledger()
+        # The list is the ledger (date, created_at, id), newest first
+        self.assertEqual([(item['date'], item['amount'], item['balance']) for item in items], [
+            ('2025-03-19', '5.00', '1995.00'),
+            ('2025-03-17', '10.00', '1990.00'),
+            ('2025-03-11', '75.00', '850.00'),
+            ('2025-03-05', '25.00', '925.00'),
+            ('2025-03-03', '50.00', '950.00'),
+            ('2025-03-03', '100.00', '900.00'),
+            ('2025-03-02', '999.00', '999.00'),
+        ])
+        self.assertNotIn('balance', self.client.get('/api/transactions/').data['results'][0])
+
+    def test_same_day_rows_chain_in_list_order(self):
+        day = datetime.date(2025, 4, 1)
+        for _ in range(8):
+            Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('1.00'), counterparty='Y',
+                                       method='CARD', date=day)
+        rollups.rebuild([self.user])
+        items = self._ledger(date_from=day.isoformat(), page_size=3)
+        # 1995.00 after the W2 chain, then one unit less per row, oldest last
+        self.assertEqual([item['balance'] for item in items], [f'{1995 - n}.00' for n in range(8, 0, -1)])
+
+    def test_filters_keep_whole_ledger_balance(self):
+        items = self._ledger(type='INCOME')
+        self.assertEqual([item['balance'] for item in items], ['1995.00', '950.00', '999.00'])
+
+    def test_each_page_costs_the_same(self):
+        first = self.client.get('/api/transactions/', {'with_balance': 1, 'page_size': 2})
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get('/api/transactions/', {'with_balance': 1, 'page_size': 2})
+        last_url = self.client.get(first.data['next']).data['next']
+        with CaptureQueriesContext(connection) as later_page:
+            self.client.get(last_url)
+        # Validators, the page, the opening balance (at most three) and one window query
+        self.assertLessEqual(len(first_page.captured_queries), 6)
+        self.assertLessEqual(len(later_page.captured_queries), 6)
+
+    def test_window_starts_at_the_page_despite_generated_weeks(self):
+        monday = datetime.date(2025, 3, 3)
+        for week in range(3, 10):
+            Transaction.objects.create(user=self.user, type='EXPENSE', amount=Decimal('1.00'), counterparty='Z',
+                                       method='CARD', date=monday + datetime.timedelta(weeks=week, days=1))
+        rollups.rebuild([self.user])
+        periods.generate_weeks(users=[self.user], until=monday + datetime.timedelta(weeks=10))
+
+        week9 = monday + datetime.timedelta(weeks=9)
+        last = Transaction.objects.get(user=self.user, date=week9 + datetime.timedelta(days=1))
+        with CaptureQueriesContext(connection) as ctx:
+            balances = reports.running_balances(self.user, [last.id], week9, week9 + datetime.timedelta(days=6))
+        # The W2 snapshot (1995.00 after its week), less one unit a week
+        self.assertEqual(balances, {last.id: Decimal('1988.00')})
+        # The window reads the page's dates only, not the weeks since W2
+        [window] = [q['sql'] for q in ctx.captured_queries if 'OVER' in q['sql']]
+        self.assertRegex(window, rf'"finance_transaction"\."date" >= \'{week9.isoformat()}\'')
+
+
+class WeekGenerationTests(TestCase):
+    W0 = datetime.date(2025, 3, 3)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='weekuser', email='week@example.com', password='x')
+        self.other = User.objects.create_user(username='weekother', email='weekother@example.com', password='x')
+        self.empty = User.objects.create_user(username='weekempty', email='weekempty@example.com', password='x')
+        inactive = User.objects.create_user(username='weekgone', email='weekgone@example.com', password='x',
+                                            is_active=False)
+        for user, weeks, type, amount in [
+            (self.user, 0, 'INCOME', '1000.00'), (self.user, 1, 'EXPENSE', '200.00'),
+            (self.user, 3, 'EXPENSE', '50.00'), (self.other, 1, 'INCOME', '300.00'),
+            (inactive, 0, 'INCOME', '1.00'),
+        ]:
+            Transaction.objects.create(user=user, type=type, amount=Decimal(amount), counterparty='X', method='CARD',
+                                       date=self.W0 + datetime.timedelta(weeks=weeks, days=2))
+        rollups.rebuild([self.user, self.other, inactive])
+        # Snapshot that disagrees with the carried balance (800): it wins
+        WeeklyPeriod.objects.create(user=self.user, week_start_date=self._week(2), opening_balance=Decimal('900.00'))
+
+    def _week(self, n):
+        return self.W0 + datetime.timedelta(weeks=n)
+
+    def _openings(self, user):
+        return list(WeeklyPeriod.objects.filter(user=user).order_by('week_start_date')
+                    .values_list('week_start_date', 'opening_balance'))
+
+    # --- USE CASE 42: Missing weeks with carried-forward balances ---
+    def test_generate_carries_balances_in_batches(self):
+        until = self._week(4) + datetime.timedelta(days=3)
+        with CaptureQueriesContext(connection) as ctx:
+            result = periods.generate_weeks(until=until, batch_size=2)
+        self.assertEqual(result, {'users': 3, 'created': 4 + 4 + 1, 'refreshed': 0})
+        # Two batches of users plus the final empty one
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 2 * 12)
+
+        self.assertEqual(self._openings(self.user), [
+            # Derived backwards from the W2 snapshot
+            (self._week(0), Decimal('100.00')), (self._week(1), Decimal('1100.00')),
+            (self._week(2), Decimal('900.00')), (self._week(3), Decimal('900.00')),
+            (self._week(4), Decimal('850.00')),
+        ])
+        self.assertEqual(self._openings(self.other), [
+            (self._week(1), Decimal('0.00')), (self._week(2), Decimal('300.00')),
+            (self._week(3), Decimal('300.00')), (self._week(4), Decimal('300.00')),
+        ])
+        self.assertEqual(self._openings(self.empty), [(self._week(4), Decimal('0.00'))])
+        self.assertFalse(WeeklyPeriod.objects.filter(user__is_active=False).exists())
+        self.assertEqual(changelog.current(self.other)[0], ChangeLog.objects.filter(user=self.other).count())
+
+        self.assertEqual(periods.generate_weeks(until=until)['created'], 0)
+
+    def test_action_and_command(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        response = client.post('/api/weeks/generate/')
+        self.assertEqual(response.status_code, 200)
+        current_week = timezone.localdate() - datetime.timedelta(days=timezone.localdate().weekday())
+        self.assertEqual(response.data['created'], (current_week - self._week(1)).days // 7 + 1)
+        self.assertFalse(WeeklyPeriod.objects.filter(user=self.user).exclude(week_start_date=self._week(2)).exists())
+
+        out = io.StringIO()
+        call_command('generate_weeks', '--user', 'week@example.com', '--until', '2025-03-24', stdout=out)
+        self.assertIn('Created 3 weeks for 1 users', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('generate_weeks', '--until', 'soon')
+
+    def test_deleted_week_can_be_created_again(self):
+        client = APIClient()
+        client.force_authenticate(self.empty)
+        payload = {'week_start_date': str(self._week(0)), 'opening_balance': '10.00'}
+        week_id = client.post('/api/weeks/', payload).data['id']
+        response = client.post('/api/weeks/', payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('week_start_date', response.data)
+        self.assertEqual(client.delete(f'/api/weeks/{week_id}/').status_code, 204)
+        response = client.post('/api/weeks/', payload)
+        self.assertEqual(response.status_code, 201)
+
+        # One push deletes the live week and creates its replacement
+        response = client.post('/api/sync/push/', {'weeks': [
+            {**payload, 'id': response.data['id'], 'deleted_at': timezone.now().isoformat()},
+            {**payload, 'id': str(uuid.uuid4())},
+        ]}, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']['weeks']], ['updated', 'created'])
+
+        # Generation fills a deleted week's date again
+        WeeklyPeriod.objects.filter(user=self.empty).update(deleted_at=timezone.now())
+        self.assertEqual(periods.generate_weeks(users=[self.empty], until=self._week(0))['created'], 1)
+        self.assertEqual(WeeklyPeriod.objects.filter(user=self.empty, deleted_at__isnull=True).count(), 1)
+        self.assertEqual(WeeklyPeriod.objects.filter(user=self.empty).count(), 4)
+
+    def test_backdated_write_is_carried_past_generated_weeks(self):
+        until = self._week(4)
+        periods.generate_weeks(users=[self.user], until=until)
+        self.assertEqual(list(WeeklyPeriod.objects.filter(user=self.user, derived=False)
+                              .values_list('week_start_date', flat=True)), [self._week(2)])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post('/api/transactions/', {
+            'type': 'EXPENSE', 'amount': '100.00', 'date': str(self._week(3) + datetime.timedelta(days=1)),
+            'counterparty': 'Late', 'method': 'CARD',
+        })
+        # Derived weeks do not anchor, so reports see it before any rerun
+        summary = {row['period_start']: row for row in balance_summary(self.user, self._week(3), until)}
+        self.assertEqual(summary[self._week(4)]['opening_balance'], Decimal('750.00'))
+        self.assertEqual(reports.current_balance(self.user, until), Decimal('750.00'))
+
+        # A rerun refreshes the stored opening, and logs it for sync
+        seq = changelog.current(self.user)[0]
+        result = periods.generate_weeks(users=[self.user], until=until)
+        self.assertEqual((result['created'], result['refreshed']), (0, 1))
+        week = WeeklyPeriod.objects.get(user=self.user, week_start_date=self._week(4))
+        self.assertEqual((week.opening_balance, week.derived), (Decimal('750.00'), True))
+        self.assertEqual(changelog.current(self.user)[0], seq + 1)
+
+        # A week the user writes becomes a snapshot: it anchors and is kept
+        response = client.patch(f'/api/weeks/{week.id}/', {'opening_balance': '700.00'})
+        self.assertFalse(response.data['derived'])
+        summary = {row['period_start']: row for row in balance_summary(self.user, self._week(3), until)}
+        self.assertEqual(summary[self._week(4)]['opening_balance'], Decimal('700.00'))
+        self.assertEqual(periods.generate_weeks(users=[self.user], until=until)['refreshed'], 0)
+        week.refresh_from_db()
+        self.assertEqual(week.opening_balance, Decimal('700.00'))
@@ -1,12 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TransactionViewSet, ScheduledPaymentViewSet, WeeklyPeriodViewSet, SyncView
+from .views import (
+    TransactionViewSet, ScheduledPaymentViewSet, WeeklyPeriodViewSet, SyncView, ExportView,
+    RecurringPaymentViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'payments', ScheduledPaymentViewSet, basename='payment')
+router.register(r'recurring-payments', RecurringPaymentViewSet, basename='recurring-payment')
 router.register(r'weeks', WeeklyPeriodViewSet, basename='week')
 router.register(r'sync', SyncView, basename='sync')
+router.register(r'export', ExportView, basename='export')
 
 urlpatterns = [
     path('', include(router.urls)),
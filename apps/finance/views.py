@@ -1,138 +1,547 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .models import Transaction, ScheduledPayment, WeeklyPeriod
-from .serializers import TransactionSerializer, ScheduledPaymentSerializer, WeeklyPeriodSerializer
+from rest_framework.settings import api_settings
+from .models import Transaction, ScheduledPayment, WeeklyPeriod, RecurringPayment
+from .serializers import (
+    TransactionSerializer, ScheduledPaymentSerializer, WeeklyPeriodSerializer,
+    SummaryQuerySerializer, BalanceSummarySerializer, TransactionFilterSerializer,
+    MarkPaidBatchSerializer, ImportStatementSerializer, RecurringPaymentSerializer, UpcomingQuerySerializer,
+    fast_serializer,
+)
+from .reports import balance_summary, current_balance, running_balances
+from .cache import get_cached_upcoming, set_cached_upcoming, upcoming_version
+from . import changelog, export, importer, periods, recurrence, rollups
+from .pagination import FinanceCursorPagination
+from .sync import (
+    parse_since, parse_seq, issue_cursor, changed_since, apply_push, apply_bulk,
+    wants_stream, wants_compact, wants_diagnostics, stream_pull, compact_pull,
+)
+from .renderers import NDJSONRenderer
+from .conditional import Validators
+from .idempotency import idempotent
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import copy
+import io
+
+def _fast_data(serializer_class, queryset):
+    fast = fast_serializer(serializer_class)
+    return fast.serialize(fast.values(queryset))
+
+def _deleted_at(section):
+    # Pull sections are lists of dicts, or {"fields", "rows"} when compact
+    if isinstance(section, dict):
+        index = section['fields'].index('deleted_at')
+        return [row[index] for row in section['rows']]
+    return [row['deleted_at'] for row in section]
 
 class BaseFinanceViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinanceCursorPagination
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user, deleted_at__isnull=True)
 
+    def list(self, request, *args, **kwargs):
+        # Idle polls stop here: one aggregate query, no serialization
+        validators = Validators(request)
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return validators.apply(not_modified)
+
+        # Read-only fast path: render .values() rows instead of model instances
+        fast = fast_serializer(self.get_serializer_class())
+        rows = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return validators.apply(self.get_paginated_response(self.list_data(fast, page)))
+        return validators.apply(Response(self.list_data(fast, rows)))
+
+    def list_data(self, fast, rows):
+        # Hook for per-viewset extra columns on the rendered list rows
+        return fast.serialize(rows)
+
+    # Writes are atomic so the post_save change log entry (see signals.py)
+    # commits together with the row
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with db_transaction.atomic():
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        with db_transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        # Soft delete: the row stays behind as a tombstone for delta sync
+        with db_transaction.atomic():
+            instance.deleted_at = timezone.now()
+            instance.save()
 
 class WeeklyPeriodViewSet(BaseFinanceViewSet):
     queryset = WeeklyPeriod.objects.all()
     serializer_class = WeeklyPeriodSerializer
+    cursor_ordering = ('-week_start_date',)
+
+    # Longest range a single summary request may cover
+    SUMMARY_MAX_DAYS = 366 * 5
+
+    # The serializer checks the date is free; a concurrent write can still
+    # take it before the insert
+    def perform_create(self, serializer):
+        try:
+            super().perform_create(serializer)
+        except IntegrityError:
+            raise ValidationError({'week_start_date': ['Already exists for this user.']})
+
+    def perform_update(self, serializer):
+        try:
+            super().perform_update(serializer)
+        except IntegrityError:
+            raise ValidationError({'week_start_date': ['Already exists for this user.']})
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """
+        Create the caller's missing weeks up to the current one, with
+        opening balances carried forward (see periods.py).
+        """
+        result = periods.generate_weeks(users=[request.user])
+        return Response({'created': result['created']})
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        params = SummaryQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        period = params.validated_data['period']
+        date_to = params.validated_data.get('date_to') or timezone.now().date()
+        default_span = timedelta(weeks=12) if period == 'week' else timedelta(days=365)
+        date_from = params.validated_data.get('date_from') or date_to - default_span
+
+        if (date_to - date_from).days > self.SUMMARY_MAX_DAYS:
+            return Response({'error': 'Date range is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = balance_summary(request.user, date_from, date_to, period)
+        return Response({
+            'period': period,
+            'date_from': date_from,
+            'date_to': date_to,
+            'results': BalanceSummarySerializer(results, many=True).data,
+        })
 
 class ScheduledPaymentViewSet(BaseFinanceViewSet):
     queryset = ScheduledPayment.objects.all()
     serializer_class = ScheduledPaymentSerializer
+    cursor_ordering = ('due_date', 'id')
 
-    @action(detail=True, methods=['post'], url_path='mark-paid')
-    def mark_paid(self, request, pk=None):
-        payment = self.get_object()
-        if payment.status == 'PAID':
-            return Response({'error': 'Already paid'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create linked transaction
-        transaction = Transaction.objects.create(
-            user=request.user,
+    @staticmethod
+    def _payment_transaction(payment, today):
+        return Transaction(
+            user_id=payment.user_id,
             type='EXPENSE',
             amount=payment.amount,
-            date=timezone.now().date(),
+            date=today,
             counterparty=payment.payee,
             description=f"Payment for {payment.payee}. Notes: {payment.notes}",
             method=payment.expected_method or 'OTHER',
             linked_payment=payment
         )
 
-        payment.status = 'PAID'
-        payment.paid_at = timezone.now()
-        payment.save()
+    @action(detail=True, methods=['post'], url_path='mark-paid')
+    @idempotent
+    def mark_paid(self, request, pk=None):
+        with db_transaction.atomic():
+            # Row lock: a concurrent tap waits here, then sees PAID
+            payment = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            if payment.status == 'PAID':
+                return Response({'error': 'Already paid'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Create linked transaction
+            transaction = self._payment_transaction(payment, timezone.now().date())
+            try:
+                with db_transaction.atomic():
+                    transaction.save()
+            except IntegrityError:
+                # A transaction pushed by a client is already linked to it
+                return Response({'error': 'Payment already has a linked transaction'},
+                                status=status.HTTP_409_CONFLICT)
+            rollups.apply_changes([(None, transaction)])
+
+            payment.status = 'PAID'
+            payment.paid_at = timezone.now()
+            payment.save()
 
         return Response({
             'payment': self.get_serializer(payment).data,
             'transaction': TransactionSerializer(transaction).data
         })
 
+    @action(detail=False, methods=['post'], url_path='mark-paid')
+    @idempotent
+    def mark_paid_batch(self, request):
+        """
+        Mark many payments paid in one DB transaction: POST {"ids": [...]}.
+        Returns one result per id, like sync push: paid (with the new
+        transaction id) or error.
+        """
+        params = MarkPaidBatchSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(params.validated_data['ids']))
+
+        now = timezone.now()
+        with db_transaction.atomic():
+            # Locks taken in id order, so overlapping batches cannot deadlock
+            payments = {p.id: p for p in self.get_queryset().select_for_update().filter(id__in=ids).order_by('id')}
+            linked = set(
+                Transaction.objects.filter(linked_payment__in=list(payments)).values_list('linked_payment_id', flat=True)
+            )
+            results, transactions, paid = [], [], []
+            for payment_id in ids:
+                payment = payments.get(payment_id)
+                if payment is None:
+                    error = {'id': ['Not found.']}
+                elif payment.status == 'PAID':
+                    error = {'status': ['Already paid.']}
+                elif payment_id in linked:
+                    error = {'id': ['Payment already has a linked transaction.']}
+                else:
+                    transaction = self._payment_transaction(payment, now.date())
+                    transactions.append(transaction)
+                    paid.append(payment)
+                    results.append({'id': str(payment_id), 'status': 'paid', 'transaction': str(transaction.id)})
+                    continue
+                results.append({'id': str(payment_id), 'status': 'error', 'errors': error})
+
+            if paid:
+                for payment in paid:
+                    payment.status = 'PAID'
+                    payment.paid_at = now
+                    # bulk_update() skips auto_now, and delta sync depends on it
+                    payment.updated_at = now
+                try:
+                    with db_transaction.atomic():
+                        Transaction.objects.bulk_create(transactions)
+                except IntegrityError:
+                    # A transaction pushed by a client linked one of them
+                    # after the check above; nothing was written
+                    return Response({'error': 'A payment already has a linked transaction'},
+                                    status=status.HTTP_409_CONFLICT)
+                ScheduledPayment.objects.bulk_update(paid, ['status', 'paid_at', 'updated_at'])
+                # Bulk writes send no post_save
+                rollups.apply_changes([(None, transaction) for transaction in transactions])
+                changelog.record_changes(
+                    [(transaction, True) for transaction in transactions] + [(payment, False) for payment in paid]
+                )
+
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'])
+    def upcoming(self, request):
+        """
+        Pending payments due within `?days=` (default 7) plus the overdue
+        ones, with their totals and the balance left once they are paid.
+        Cached per user until the next logged write (see changelog.py).
+        """
+        params = UpcomingQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        days = params.validated_data['days']
+        today = timezone.localdate()
+        # Read before the data, so a write committing meanwhile retires it
+        version = upcoming_version(request.user.pk)
+        data = get_cached_upcoming(request.user.pk, today, days, version)
+        if data is None:
+            data = self._upcoming(request.user, today, days)
+            set_cached_upcoming(request.user.pk, today, days, data, version)
+        return Response(data)
+
+    def _upcoming(self, user, today, days):
+        date_to = today + timedelta(days=days)
+        # Served by payment_user_pending_idx
+        pending = ScheduledPayment.objects.filter(
+            user=user, status='PENDING', deleted_at__isnull=True, due_date__lte=date_to,
+        ).order_by('due_date', 'id')
+        fast = fast_serializer(self.get_serializer_class())
+        overdue, upcoming = [], []
+        overdue_total = upcoming_total = Decimal('0.00')
+        for row in fast.values(pending):
+            if row['due_date'] < today:
+                overdue.append(row)
+                overdue_total += row['amount']
+            else:
+                upcoming.append(row)
+                upcoming_total += row['amount']
+        balance = current_balance(user, today)
+        return {
+            'date_from': today.isoformat(),
+            'date_to': date_to.isoformat(),
+            'overdue': fast.serialize(overdue),
+            'upcoming': fast.serialize(upcoming),
+            'overdue_total': str(overdue_total),
+            'upcoming_total': str(upcoming_total),
+            'current_balance': str(balance),
+            'projected_balance': str(balance - overdue_total - upcoming_total),
+        }
+
+class RecurringPaymentViewSet(BaseFinanceViewSet):
+    queryset = RecurringPayment.objects.all()
+    serializer_class = RecurringPaymentSerializer
+
+    def _materialise(self):
+        # Occurrences inside the scheduler's horizon appear right away
+        # instead of on its next run
+        until = timezone.localdate() + timedelta(days=recurrence.MATERIALISE_DAYS_AHEAD)
+        recurrence.materialise(until, users=[self.request.user])
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self._materialise()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._materialise()
+
+    def perform_destroy(self, instance):
+        with db_transaction.atomic():
+            super().perform_destroy(instance)
+            recurrence.cancel_pending(instance)
+
 class TransactionViewSet(BaseFinanceViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    # Ledger order, newest first: running balances chain down the page
+    cursor_ordering = ('-date', '-created_at', '-id')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+        params = TransactionFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        # Date range rides tx_user_active_date_idx; the rest filter its rows
+        lookups = {
+            'date__gte': filters.get('date_from'),
+            'date__lte': filters.get('date_to'),
+            'type': filters.get('type'),
+            'method': filters.get('method'),
+            'amount__gte': filters.get('min_amount'),
+            'amount__lte': filters.get('max_amount'),
+        }
+        queryset = queryset.filter(**{key: value for key, value in lookups.items() if value is not None})
+        if filters.get('linked_payment') is not None:
+            queryset = queryset.filter(linked_payment__isnull=not filters['linked_payment'])
+        if filters.get('search'):
+            # Trigram-indexed on PostgreSQL (migration 0007)
+            term = filters['search']
+            queryset = queryset.filter(Q(counterparty__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+    def list_data(self, fast, rows):
+        data = super().list_data(fast, rows)
+        if self.request.query_params.get('with_balance') not in ('1', 'true') or not rows:
+            return data
+        # Balance after each row over the whole ledger, whatever the filters
+        balances = running_balances(
+            self.request.user, [row['id'] for row in rows],
+            min(row['date'] for row in rows), max(row['date'] for row in rows),
+        )
+        for row, item in zip(rows, data):
+            item['balance'] = str(balances[row['id']])
+        return data
+
+    # Largest list accepted by the bulk endpoint
+    BULK_MAX_ITEMS = 10000
+
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request):
+        """
+        POST a list of new transactions or PATCH a list of partial updates
+        (each with its id). Rows are validated one by one and written with
+        bulk_create/bulk_update in one DB transaction. By default one invalid
+        item rejects the whole batch (400); with ?allow_partial=1 the valid
+        items are written and the invalid ones reported.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of items.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.BULK_MAX_ITEMS:
+            return Response({'error': f'At most {self.BULK_MAX_ITEMS} items per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        allow_partial = request.query_params.get('allow_partial') in ('1', 'true')
+        mode = 'create' if request.method == 'POST' else 'update'
+        results = apply_bulk(request.user, 'transactions', items, mode, all_or_nothing=not allow_partial)
+
+        if not allow_partial and any(result['status'] == 'error' for result in results):
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif mode == 'create':
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'results': results}, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_statement(self, request):
+        """
+        Upload a CSV or OFX statement (multipart field `file`). The upload is
+        read as a stream and written in batches; rows imported before are
+        skipped. Very large files are better served by
+        `manage.py import_statement`.
+        """
+        params = ImportStatementSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+        upload = options['file']
+        file_type = options.get('file_type') or importer.guess_file_type(upload.name)
+
+        stream = io.TextIOWrapper(upload.file, encoding=options['encoding'], newline='')
+        try:
+            records = importer.read_statement(
+                stream, file_type, mapping=options.get('mapping'), delimiter=options['delimiter'],
+                date_format=options['date_format'], decimal_comma=options['decimal_comma'],
+            )
+            result = importer.import_records(request.user, records, default_method=options['method'])
+        except (UnicodeDecodeError, importer.ImportRowError) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            # Leave the upload's file open for Django to clean up
+            stream.detach()
+        return Response(result)
+
+    # Every write also moves the weekly rollups, in the same DB transaction
+    def perform_create(self, serializer):
+        with db_transaction.atomic():
+            super().perform_create(serializer)
+            rollups.apply_changes([(None, serializer.instance)])
+
+    def perform_update(self, serializer):
+        with db_transaction.atomic():
+            before = copy.copy(serializer.instance)
+            super().perform_update(serializer)
+            rollups.apply_changes([(before, serializer.instance)])
+
+    def perform_destroy(self, instance):
+        with db_transaction.atomic():
+            before = copy.copy(instance)
+            super().perform_destroy(instance)
+            rollups.apply_changes([(before, instance)])
 
 class SyncView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
 
     @action(detail=False, methods=['get'])
     def pull(self, request):
+        # `seq` (change log cursor) supersedes the older `since` timestamp
         since = request.query_params.get('since')
-        if not since:
-            return Response({'error': 'since parameter is required'}, status=400)
-        
-        # In a real scenario, we'd filter by since
-        # For MVP, we'll return everything or filter if we have updated_at
-        # DEBUG: Print to console
-        print(f"DEBUG SYNC: User={request.user.email} (ID: {request.user.id})")
-        print(f"DEBUG SYNC: Params since={since}")
-        
-        # For MVP/Debugging: Return all active records to ensure data visibility
-        # irrespective of client-side 'since' timestamp mismatches.
-        transactions = Transaction.objects.filter(user=request.user)
-        payments = ScheduledPayment.objects.filter(user=request.user)
-        weeks = WeeklyPeriod.objects.filter(user=request.user)
-        
-        print(f"DEBUG SYNC: Found {transactions.count()} txs, {payments.count()} payments")
+        seq = request.query_params.get('seq')
+        since_dt = after_seq = None
+        if seq is not None:
+            after_seq = parse_seq(seq)
+            if after_seq is None:
+                return Response({'error': 'seq must be a non-negative integer'}, status=400)
+        elif not since:
+            return Response({'error': 'since or seq parameter is required'}, status=400)
+        else:
+            since_dt = parse_since(since)
+            if since_dt is None:
+                return Response({'error': 'since must be an ISO 8601 timestamp'}, status=400)
 
-        return Response({
-            'transactions': TransactionSerializer(transactions, many=True).data,
-            'payments': ScheduledPaymentSerializer(payments, many=True).data,
-            'weeks': WeeklyPeriodSerializer(weeks, many=True).data,
-            'debug_info': {
-                'user_email': request.user.email,
+        # Issue the next cursor before reading, so anything written while this
+        # pull runs is returned again on the next one.
+        server_time = timezone.now()
+        cursor = issue_cursor(server_time)
+
+        owned = (
+            Transaction.objects.filter(user=request.user),
+            ScheduledPayment.objects.filter(user=request.user),
+            WeeklyPeriod.objects.filter(user=request.user),
+        )
+        # Also reads the latest seq, before any data, like the timestamp cursor
+        validators = Validators(request)
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return validators.apply(not_modified)
+
+        if after_seq is not None:
+            transactions, payments, weeks = (
+                changelog.changed_between(qs, key, request.user, after_seq, validators.seq)
+                for key, qs in zip(('transactions', 'payments', 'weeks'), owned)
+            )
+        else:
+            transactions, payments, weeks = (changed_since(qs, since_dt) for qs in owned)
+
+        sections = (
+            ('transactions', transactions, TransactionSerializer),
+            ('payments', payments, ScheduledPaymentSerializer),
+            ('weeks', weeks, WeeklyPeriodSerializer),
+        )
+        if wants_stream(request):
+            return validators.apply(
+                StreamingHttpResponse(stream_pull(sections, cursor, seq=validators.seq), content_type=NDJSONRenderer.media_type)
+            )
+
+        if wants_compact(request):
+            data = compact_pull(sections)
+        else:
+            data = {key: _fast_data(serializer_class, qs) for key, qs, serializer_class in sections}
+        data['cursor'] = cursor
+        data['seq'] = validators.seq
+        if wants_diagnostics(request):
+            # Built from what this pull already loaded; never queries again
+            deleted = {key: _deleted_at(data[key]) for key, _, _ in sections}
+            data['diagnostics'] = {
                 'user_id': str(request.user.id),
-                'total_db_transactions': Transaction.objects.count(),
-                'user_transactions_count': transactions.count(),
-                'server_time': str(timezone.now()),
-                'since_param': since
+                'since': since,
+                'since_parsed': since_dt.isoformat() if since_dt else None,
+                'seq': after_seq,
+                'server_time': server_time.isoformat(),
+                'counts': {key: len(values) for key, values in deleted.items()},
+                'tombstones': {key: sum(1 for value in values if value) for key, values in deleted.items()},
             }
-        })
+        return validators.apply(Response(data))
 
     @action(detail=False, methods=['post'])
     def push(self, request):
-        data = request.data
-        user = request.user
-
-        # 1. Process Transactions
-        transactions_data = data.get('transactions', [])
-        for item in transactions_data:
-            tx_id = item.get('id')
-            # Remove read-only or non-model fields
-            item.pop('is_synced', None)
-            item.pop('type_display', None)
-            item.pop('method_display', None)
-            
-            Transaction.objects.update_or_create(
-                id=tx_id,
-                user=user,
-                defaults=item
-            )
+        results = apply_push(request.user, request.data)
+        return Response({'status': 'sync complete', 'results': results})
 
-        # 2. Process Scheduled Payments
-        payments_data = data.get('payments', [])
-        for item in payments_data:
-            p_id = item.get('id')
-            item.pop('is_synced', None)
-            item.pop('status_display', None)
-            
-            ScheduledPayment.objects.update_or_create(
-                id=p_id,
-                user=user,
-                defaults=item
-            )
 
-        # 3. Process Weekly Periods
-        weeks_data = data.get('weeks', [])
-        for item in weeks_data:
-            w_id = item.get('id')
-            item.pop('is_synced', None)
-            
-            WeeklyPeriod.objects.update_or_create(
-                id=w_id,
-                user=user,
-                defaults=item
-            )
+class ExportView(viewsets.ViewSet):
+    """
+    GET /api/export/?output=csv|ndjson|columnar streams the caller's whole
+    history. `?section=` (repeatable) picks transactions, payments or weeks;
+    CSV takes exactly one. `?include_deleted=1` adds soft-deleted rows.
+    The parameter is `output`, not `format`, which DRF reserves for renderers.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is written by the exporter, whatever the Accept header says
+        return super().perform_content_negotiation(request, force=True)
+
+    def list(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        sections = request.query_params.getlist('section')
+        if not sections:
+            sections = ['transactions'] if output == 'csv' else list(export.SECTIONS)
+        include_deleted = request.query_params.get('include_deleted') in ('1', 'true')
+        try:
+            chunks = export.export(request.user, output, sections, include_deleted)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'status': 'sync complete'})
+        content_type, extension = export.FORMATS[output]
+        name = sections[0] if len(sections) == 1 else 'finance'
+        response = StreamingHttpResponse(chunks, content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate().isoformat()}.{extension}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
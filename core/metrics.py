@@ -0,0 +1,82 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+# Samples kept per endpoint; percentiles are computed over this window
+WINDOW = getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+
+
+class MetricsRegistry:
+    """In-process, per-endpoint window of request samples (per worker)."""
+
+    FIELDS = ('total_ms', 'db_ms', 'render_ms', 'queries')
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+
+    def record(self, endpoint, sample):
+        with self._lock:
+            self._samples[endpoint].append(sample)
+            self._counts[endpoint] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {endpoint: list(window) for endpoint, window in self._samples.items()}
+            counts = dict(self._counts)
+
+        report = {}
+        for endpoint, window in sorted(samples.items()):
+            stats = {'count': counts[endpoint], 'window': len(window)}
+            for field in self.FIELDS:
+                values = sorted(sample[field] for sample in window)
+                stats[field] = {
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                    'max': values[-1],
+                }
+            report[endpoint] = stats
+        return report
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile over already sorted values
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return round(values[rank - 1], 2)
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Counts queries and DB time for every connection it is attached to."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+    def attach(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
@@ -0,0 +1,79 @@
+import time
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from .metrics import QueryTimer, registry
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, DB time, render time and total latency for every
+    request that resolves to a view, keyed by "<METHOD> <view name>".
+    Numbers are exposed as a Server-Timing header and aggregated in
+    core.metrics.registry (see /api/metrics/).
+
+    Render time is measured between process_template_response and the
+    post-render callback, i.e. the JSON encoding of DRF responses. Queries
+    issued while a StreamingHttpResponse is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = QueryTimer()
+        request._metrics_render = 0.0
+        with timer.attach():
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        render = request._metrics_render
+        registry.record(f'{request.method} {match.view_name}', {
+            'total_ms': total * 1000,
+            'db_ms': timer.seconds * 1000,
+            'render_ms': render * 1000,
+            'queries': timer.queries,
+        })
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={timer.seconds * 1000:.2f};desc="{timer.queries} queries"',
+                f'render;dur={render * 1000:.2f};desc="serialization"',
+                f'app;dur={(total - timer.seconds - render) * 1000:.2f}',
+                f'total;dur={total * 1000:.2f}',
+            ])
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(_response):
+            request._metrics_render += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class APICompressionMiddleware(GZipMiddleware):
+    """
+    gzip for API responses, negotiated through Accept-Encoding. Only paths
+    under API_COMPRESSION_PREFIX are touched, and buffered bodies smaller than
+    API_COMPRESSION_MIN_LENGTH are sent as is (not worth the CPU). Streamed
+    responses (NDJSON pulls) are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.prefix = getattr(settings, 'API_COMPRESSION_PREFIX', '/api/')
+        self.min_length = getattr(settings, 'API_COMPRESSION_MIN_LENGTH', 1024)
+
+    def process_response(self, request, response):
+        if not request.path.startswith(self.prefix):
+            return response
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        return super().process_response(request, response)
@@ -15,11 +15,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # Prefixed routes (Default)
     path('api/auth/', include('apps.accounts.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
     path('api/', include('apps.finance.urls')),
     # Fallback routes (in case of double prefix or proxy stripping)
     path('auth/', include('apps.accounts.urls')),
@@ -0,0 +1,16 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .metrics import registry
+
+
+class MetricsView(APIView):
+    """Per-endpoint latency, DB time and query percentiles for this worker."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(registry.snapshot())
+
+    def delete(self, request):
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,79 @@
+import os
+import django
+import random
+import time
+import uuid
+from decimal import Decimal
+from datetime import date, timedelta
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.utils import timezone
+from apps.finance.models import Transaction
+from apps.finance.serializers import TransactionSerializer, fast_serializer
+
+# Compares the ModelSerializer read path with FastReadSerializer on in-memory
+# rows, so no database is needed. The model path is given ready-made
+# instances, which flatters it: in production it also pays for building them.
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEAT = 5
+
+
+def build_rows(n):
+    user_id = uuid.uuid4()
+    now = timezone.now()
+    rows = []
+    for i in range(n):
+        rows.append({
+            'id': uuid.uuid4(),
+            'user': user_id,
+            'type': random.choice(['INCOME', 'EXPENSE']),
+            'amount': Decimal(random.uniform(1, 500)).quantize(Decimal('0.01')),
+            'date': date(2025, 1, 1) + timedelta(days=i % 365),
+            'counterparty': random.choice(['Starbucks', 'Supermaxi', 'Uber Eats', 'Tech Solutions Inc.']),
+            'description': 'Generated',
+            'method': random.choice(['TRANSFER', 'CASH', 'CARD', 'OTHER']),
+            'linked_payment': None,
+            'import_hash': '',
+            'created_at': now,
+            'updated_at': now,
+            'deleted_at': None,
+        })
+    return rows
+
+
+def best_of(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run():
+    rows = build_rows(ROWS)
+    instances = [
+        Transaction(**{('user_id' if k == 'user' else 'linked_payment_id' if k == 'linked_payment' else k): v
+                       for k, v in row.items()})
+        for row in rows
+    ]
+    fast = fast_serializer(TransactionSerializer)
+    assert fast.serialize(rows[:100]) == TransactionSerializer(instances[:100], many=True).data
+
+    model_time = best_of(lambda: TransactionSerializer(instances, many=True).data)
+    fast_time = best_of(lambda: fast.serialize(rows))
+
+    print(f"--- Serializing {ROWS} transactions (best of {REPEAT}) ---")
+    print(f"ModelSerializer:    {model_time * 1000:8.1f} ms")
+    print(f"FastReadSerializer: {fast_time * 1000:8.1f} ms")
+    print(f"Speedup:            {model_time / fast_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    run()
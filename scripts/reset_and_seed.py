@@ -11,6 +11,8 @@ django.setup()
 
 from apps.accounts.models import User
 from apps.finance.models import Transaction, ScheduledPayment, WeeklyPeriod
+from apps.finance import changelog, rollups
+from apps.finance.seeding import generate_transactions
 
 def smart_seed():
     email = "oscar@nezuecuador.com"
@@ -38,85 +40,11 @@ def smart_seed():
     )
 
     # 2. Detailed Transactions (Massive Year Generation - 2025)
-    import random
-    transactions = []
-    
     start_date = date(2025, 1, 1)
     end_date = date(2025, 12, 31)
-    current = start_date
     
     print(f"Generating data from {start_date} to {end_date}...")
-
-    while current <= end_date:
-        # --- Income (15th and 30th) ---
-        if current.day == 15 or current.day == 30:
-            transactions.append({
-                'type': 'INCOME', 'amount': Decimal("3200.00"), 
-                'date': current, 'counterparty': "Tech Solutions Inc.", 
-                'desc': "Nómina Quincenal", 'method': 'TRANSFER'
-            })
-
-        # --- Fixed Expenses (1st and 5th) ---
-        if current.day == 1:
-            transactions.append({
-                'type': 'EXPENSE', 'amount': Decimal("850.00"), 
-                'date': current, 'counterparty': "Inmobiliaria Central", 
-                'desc': "Renta Mensual", 'method': 'TRANSFER'
-            })
-        if current.day == 5:
-            transactions.append({
-                'type': 'EXPENSE', 'amount': Decimal("60.00"), 
-                'date': current, 'counterparty': "Claro Internet", 
-                'desc': "Servicio Internet", 'method': 'CARD'
-            })
-
-        # --- Variable Daily Expenses ---
-        
-        # 1. Morning Coffee (70% chance)
-        if random.random() > 0.3:
-            transactions.append({
-                'type': 'EXPENSE', 
-                'amount': Decimal(random.uniform(3.50, 8.00)).quantize(Decimal("0.01")), 
-                'date': current, 
-                'counterparty': random.choice(["Starbucks", "Sweet & Coffee", "Juan Valdez", "Cafetería Local"]), 
-                'desc': "Café de la mañana", 
-                'method': 'CARD'
-            })
-
-        # 2. Lunch (Weekdays)
-        if current.weekday() < 5: 
-            transactions.append({
-                'type': 'EXPENSE', 
-                'amount': Decimal(random.uniform(6.00, 15.00)).quantize(Decimal("0.01")), 
-                'date': current, 
-                'counterparty': random.choice(["Subway", "KFC", "Restaurante Ejecutivo", "Uber Eats"]), 
-                'desc': "Almuerzo", 
-                'method': 'CASH'
-            })
-
-        # 3. Groceries (Saturdays or Sundays)
-        if current.weekday() == 5: # Saturday
-            transactions.append({
-                'type': 'EXPENSE', 
-                'amount': Decimal(random.uniform(80.00, 150.00)).quantize(Decimal("0.01")), 
-                'date': current, 
-                'counterparty': "Supermaxi", 
-                'desc': "Mercado Semanal", 
-                'method': 'CARD'
-            })
-
-        # 4. Entertainment/Hobbies (Random ~15% chance)
-        if random.random() > 0.85:
-            transactions.append({
-                'type': 'EXPENSE', 
-                'amount': Decimal(random.uniform(20.00, 60.00)).quantize(Decimal("0.01")), 
-                'date': current, 
-                'counterparty': random.choice(["CineMark", "Steam Games", "Amazon", "Cena Fuera"]), 
-                'desc': "Entretenimiento", 
-                'method': 'CARD'
-            })
-
-        current += timedelta(days=1)
+    transactions = generate_transactions(start_date, end_date)
 
     # Bulk Create for Speed
     print(f"Bulk creating {len(transactions)} transactions...")
@@ -181,6 +109,10 @@ def smart_seed():
             )
 
     print(f"Created {len(payments)} scheduled payments.")
+
+    # Bulk inserts bypass the incremental rollup updates and the change log
+    rollups.rebuild([user])
+    changelog.rebuild([user])
     print("SEEDING COMPLETE. Sync to view changes.")
 
 if __name__ == "__main__":
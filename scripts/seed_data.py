@@ -12,6 +12,7 @@ django.setup()
 
 from apps.accounts.models import User, Profile
 from apps.finance.models import Transaction, ScheduledPayment, WeeklyPeriod
+from apps.finance import changelog, rollups
 
 def seed_data():
     email = "ocuencamoreno@gmail.com"
@@ -33,8 +34,8 @@ def seed_data():
     else:
         print("User already exists.")
 
-    # 2. Ensure Profile exists
-    Profile.objects.get_or_create(
+    # 2. Ensure Profile exists (created on signup; set the demo preferences)
+    Profile.objects.update_or_create(
         user=user,
         defaults={
             'display_name': 'Oscar',
@@ -185,6 +186,10 @@ def seed_data():
         else:
             print(f"Created pending scheduled payment for {p_data['payee']}.")
 
+    # Direct inserts bypass the incremental rollup updates and the change log
+    rollups.rebuild([user])
+    changelog.rebuild([user])
+
     print("\nSeeding complete! Log in as:")
     print(f"Email: {email}")
     print("Password: Difdesork1996@")